@@ -0,0 +1,86 @@
+"""
+Applies several refactorings to the same Java file with a single parse, a single walk and a single write.
+
+Supported refactoring kinds and their operation parameters:
+
+    `make_class_non_final`: class
+    `make_field_non_static`: class, field
+    `make_method_static`: class, method
+    `decrease_field_visibility`: class, field
+
+Example:
+
+    apply_batch("Shape.java", [
+        {"kind": "make_class_non_final", "class": "Shape"},
+        {"kind": "make_method_static", "class": "Shape", "method": "area"},
+    ])
+
+"""
+
+from antlr4.TokenStreamRewriter import TokenStreamRewriter
+
+from gen.javaLabeled.JavaParserLabeledListener import JavaParserLabeledListener
+from refactorings.decrease_field_visibility import DecreaseFieldVisibilityListener
+from refactorings.make_class_non_final import MakeNonFinalClassRefactoringListener
+from refactorings.make_field_non_static import MakeFieldNonStaticRefactoringListener
+from refactorings.make_method_static_2 import MakeMethodStaticRefactoringListener
+from refactorings.utils.early_exit_walker import EarlyExitParseTreeWalker
+from refactorings.utils.offset_rewriter import OffsetRewriter
+from refactorings.utils.parse_cache import get_parse_tree, write_back
+
+
+def _create_listener(op: dict, rewriter: TokenStreamRewriter):
+    kind = op["kind"]
+    if kind == "make_class_non_final":
+        return MakeNonFinalClassRefactoringListener(class_name=op["class"], rewriter=rewriter)
+    elif kind == "make_field_non_static":
+        return MakeFieldNonStaticRefactoringListener(source_class=op["class"], field_name=op["field"],
+                                                     rewriter=rewriter)
+    elif kind == "make_method_static":
+        return MakeMethodStaticRefactoringListener(source_class=op["class"], method_name=op["method"],
+                                                   rewriter=rewriter)
+    elif kind == "decrease_field_visibility":
+        return DecreaseFieldVisibilityListener(source_class=op["class"], source_field=op["field"], rewriter=rewriter)
+    else:
+        raise ValueError(f"Unknown refactoring kind: {kind}")
+
+
+class CompoundRefactoringListener(JavaParserLabeledListener):
+    """
+    Forwards every enter/exit event to a list of refactoring listeners sharing one rewriter.
+    A listener that has finished its rewrite (`done`) does not receive further events.
+    """
+
+    def __init__(self, listeners: list, rewriter: TokenStreamRewriter):
+        self.listeners = listeners
+        self.rewriter = rewriter
+
+    @property
+    def done(self):
+        return all(getattr(listener, "done", False) for listener in self.listeners)
+
+    def enterEveryRule(self, ctx):
+        for listener in self.listeners:
+            if not getattr(listener, "done", False):
+                ctx.enterRule(listener)
+
+    def exitEveryRule(self, ctx):
+        for listener in self.listeners:
+            if not getattr(listener, "done", False):
+                ctx.exitRule(listener)
+
+
+def apply_batch(main_file: str, ops: list):
+    """
+    Applies all the given refactoring operations to a single file.
+
+    :param main_file: The path of Java file to be refactored.
+    :param ops: A list of operations, each one a dict with a `kind` key and the kind's parameters.
+    :return: True if the file was changed.
+    """
+    token_stream, parse_tree = get_parse_tree(main_file)
+    rewriter = OffsetRewriter(token_stream)
+    listeners = [_create_listener(op, rewriter) for op in ops]
+    compound_listener = CompoundRefactoringListener(listeners, rewriter)
+    EarlyExitParseTreeWalker().walk(compound_listener, parse_tree)
+    return write_back(main_file, token_stream, rewriter.getDefaultText())
@@ -22,33 +22,56 @@ from refactorings.make_method_static import MakeMethodStaticRefactoringListener
 from refactorings.make_method_non_static import MakeMethodNonStaticRefactoringListener
 from gen.javaLabeled.JavaLexer import JavaLexer
 from gen.javaLabeled.JavaParserLabeled import JavaParserLabeled
+from refactorings.utils.byte_input_stream import input_stream
 
 
 def main(args):
     input_directory = args.directory
-    input_java_files = [file for file in os.listdir(input_directory) if '.java' in file]
+    with os.scandir(input_directory) as entries:
+        input_java_files = [entry.name for entry in entries if entry.name.endswith('.java')]
     refactoring_id = args.refactor
+    # Names of the classes the refactoring may change; the other files are copied without parsing.
+    # Collapse hierarchy finds its target class while walking, so it parses every file.
+    if refactoring_id == 'c':
+        keywords = None
+    elif refactoring_id == 'i':
+        keywords = (b'HTTPTokener', b'JSONTokener')
+    else:
+        keywords = (b'JSONPointer',)
     source_class_data = None
     target_class = None
     target_class_data = None
     is_complete = False
     print("Process started")
+    # The lexer and the parser are created once and reset for each file
+    lexer = JavaLexer(InputStream(""))
+    parser = JavaParserLabeled(CommonTokenStream(lexer))
     for i in range(2):
         for file in input_java_files:
 
             # Step 1: Load input source into stream
+            output_path = 'benchmark_projects/refactored/' + file
             if i == 0:
-                stream = FileStream(input_directory + '/' + file, encoding='utf8')
+                input_path = input_directory + '/' + file
             else:
-                stream = FileStream('benchmark_projects/refactored/' + '/' + file, encoding='utf8')
+                input_path = 'benchmark_projects/refactored/' + '/' + file
+            with open(input_path, 'rb') as f:
+                source = f.read()
+            if keywords is not None and not any(keyword in source for keyword in keywords):
+                if i == 0:
+                    with open(output_path, mode='wb') as f:
+                        f.write(source)
+                print("/\\", end='')
+                continue
+            stream = input_stream(source, input_path)
             # input_stream = StdinStream()
 
-            # Step 2: Create an instance of AssignmentStLexer
-            lexer = JavaLexer(stream)
+            # Step 2: Point the lexer to the input source
+            lexer.inputStream = stream
             # Step 3: Convert the input source into a list of tokens
             token_stream = CommonTokenStream(lexer)
-            # Step 4: Create an instance of the AssignmentStParser
-            parser = JavaParserLabeled(token_stream)
+            # Step 4: Point the parser to the tokens
+            parser.setTokenStream(token_stream)
             tree = parser.compilationUnit()
             # Step 6: Create an instance of AssignmentStListener
             if refactoring_id == 'c':
@@ -88,8 +111,11 @@ def main(args):
                     common_token_stream=token_stream, target_class='JSONPointer',
                     target_methods=['builder']
                 )
-            with open('benchmark_projects/refactored/' + file, mode='w+', newline='') as f:
-                f.write(my_listener.token_stream_rewriter.getDefaultText())
+            text = my_listener.token_stream_rewriter.getDefaultText()
+            # In the second pass the input is the output file, so an unchanged text need not be written
+            if i == 0 or text != stream.strdata:
+                with open(output_path, mode='w+', newline='') as f:
+                    f.write(text)
             print("/\\", end='')
 
 
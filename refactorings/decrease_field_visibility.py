@@ -1,16 +1,14 @@
 import logging
 
+from refactorings.utils.db_pool import get_db
 from refactorings.utils.utils2 import parse_and_walk
 
-try:
-    import understand as und
-except ImportError as e:
-    print(e)
-
 from antlr4.TokenStreamRewriter import TokenStreamRewriter
 
 from gen.javaLabeled.JavaParserLabeled import JavaParserLabeled
 from gen.javaLabeled.JavaParserLabeledListener import JavaParserLabeledListener
+from refactorings.utils.context_utils import ctx_identifier_text
+from refactorings.utils.listener_codegen import build_listener
 
 logger = logging.getLogger()
 __author__ = "Seyyed Ali Ayati"
@@ -20,40 +18,57 @@ class DecreaseFieldVisibilityListener(JavaParserLabeledListener):
     def __init__(self, source_class, source_field, rewriter: TokenStreamRewriter):
         self.source_class = source_class
         self.source_field = source_field
-        self.in_class = False
+        # names of the classes enclosing the current node, innermost last
+        self._class_stack = []
         self.in_field = False
         self.detected_field = False
         self.rewriter = rewriter
+        self.done = False
+
+    @property
+    def is_source_class(self):
+        return bool(self._class_stack) and self._class_stack[-1] == self.source_class
 
     def enterClassDeclaration(self, ctx: JavaParserLabeled.ClassDeclarationContext):
-        if ctx.IDENTIFIER().getText() == self.source_class:
-            self.in_class = True
+        if self.done:
+            return
+        self._class_stack.append(ctx_identifier_text(ctx))
 
     def exitClassDeclaration(self, ctx: JavaParserLabeled.ClassDeclarationContext):
-        if ctx.IDENTIFIER().getText() == self.source_class:
-            self.in_class = False
+        if self.done:
+            return
+        self._class_stack.pop()
 
     def enterFieldDeclaration(self, ctx: JavaParserLabeled.FieldDeclarationContext):
+        if self.done:
+            return
         self.in_field = True
 
     def exitFieldDeclaration(self, ctx: JavaParserLabeled.FieldDeclarationContext):
+        if self.done:
+            return
         self.in_field = False
 
     def enterVariableDeclaratorId(self, ctx: JavaParserLabeled.VariableDeclaratorIdContext):
-        if ctx.IDENTIFIER().getText() == self.source_field and self.in_field:
+        if self.done:
+            return
+        if self.in_field and self.is_source_class and ctx_identifier_text(ctx) == self.source_field:
             self.detected_field = True
 
     def exitClassBodyDeclaration2(self, ctx: JavaParserLabeled.ClassBodyDeclaration2Context):
+        if self.done:
+            return
         if self.detected_field:
             self.rewriter.replaceSingleToken(
                 token=ctx.modifier(0).start,
                 text="private"
             )
             self.detected_field = False
+            self.done = True
 
 
 def main(udb_path, source_package, source_class, source_field, *args, **kwargs):
-    db = und.open(udb_path)
+    db = get_db(udb_path)
     field_ent = db.lookup(f"{source_package}.{source_class}.{source_field}", "Variable")
 
     if len(field_ent) == 0:
@@ -76,19 +91,22 @@ def main(udb_path, source_package, source_class, source_field, *args, **kwargs):
             logger.error("Field cannot set to private.")
             return
 
-    parent = field_ent.parent()
-    while parent.parent() is not None:
-        parent = parent.parent()
+    def_ref = field_ent.ref("Definein") or field_ent.ref("Declarein")
+    main_file = def_ref.file().longname() if def_ref else field_ent.parent().longname()
+    with open(main_file, 'rb') as f:
+        src = f.read()
+    if not ((b'public' in src or b'protected' in src) and source_field.encode() in src):
+        return
 
-    main_file = parent.longname()
     parse_and_walk(
         file_path=main_file,
-        listener_class=DecreaseFieldVisibilityListener,
+        listener_class=build_listener(DecreaseFieldVisibilityListener, source_class=source_class,
+                                      source_field=source_field),
         has_write=True,
+        source=src,
         source_class=source_class,
         source_field=source_field
     )
-    db.close()
 
 
 if __name__ == '__main__':
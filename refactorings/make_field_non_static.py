@@ -1,17 +1,18 @@
+import argparse
 import os
 
-from gen.javaLabeled.JavaLexer import JavaLexer
-
-try:
-    import understand as und
-except ImportError as e:
-    print(e)
-
 from antlr4 import *
 from antlr4.TokenStreamRewriter import TokenStreamRewriter
 
 from gen.javaLabeled.JavaParserLabeled import JavaParserLabeled
 from gen.javaLabeled.JavaParserLabeledListener import JavaParserLabeledListener
+from refactorings.utils.context_utils import ctx_identifier_text, field_identifier_text
+from refactorings.utils.batch import apply_in_parallel, load_batch
+from refactorings.utils.early_exit_walker import EarlyExitParseTreeWalker
+from refactorings.utils.listener_codegen import build_listener
+from refactorings.utils.offset_rewriter import OffsetRewriter
+from refactorings.utils.parse_cache import get_parse_tree, write_back
+from refactorings.utils.und_cache import class_file_map
 
 
 class MakeFieldNonStaticRefactoringListener(JavaParserLabeledListener):
@@ -20,7 +21,8 @@ class MakeFieldNonStaticRefactoringListener(JavaParserLabeledListener):
     Creates a new class and move fields and methods from the old class to the new one
     """
 
-    def __init__(self, common_token_stream: CommonTokenStream = None, source_class=None, field_name: str = None):
+    def __init__(self, common_token_stream: CommonTokenStream = None, source_class=None, field_name: str = None,
+                 rewriter: TokenStreamRewriter = None):
 
         if field_name is None:
             self.field_name = ""
@@ -31,73 +33,95 @@ class MakeFieldNonStaticRefactoringListener(JavaParserLabeledListener):
             self.source_class = ""
         else:
             self.source_class = source_class
-        if common_token_stream is None:
+        if rewriter is not None:
+            # shared with other listeners walking the same tree, see compound.py
+            self.token_stream_rewriter = rewriter
+        elif common_token_stream is None:
             raise ValueError('common_token_stream is None')
         else:
-            self.token_stream_rewriter = TokenStreamRewriter(common_token_stream)
+            self.token_stream_rewriter = OffsetRewriter(common_token_stream)
 
-        self.is_source_class = False
+        # names of the classes enclosing the current node, innermost last
+        self._class_stack = []
         self.is_static = False
+        self.done = False
+        # (start token index, stop token index, text) of the target field's modifiers
+        self._modifier_tokens = None
 
-    def enterClassDeclaration(self, ctx: JavaParserLabeled.ClassDeclarationContext):
-
-        class_identifier = ctx.IDENTIFIER().getText()
-        if class_identifier == self.source_class:
-            self.is_source_class = True
-        else:
-            self.is_source_class = False
+    @property
+    def is_source_class(self):
+        return bool(self._class_stack) and self._class_stack[-1] == self.source_class
 
-    def exitFieldDeclaration(self, ctx: JavaParserLabeled.FieldDeclarationContext):
+    def enterClassDeclaration(self, ctx: JavaParserLabeled.ClassDeclarationContext):
+        if self.done:
+            return
+        self._class_stack.append(ctx_identifier_text(ctx))
+
+    def exitClassDeclaration(self, ctx: JavaParserLabeled.ClassDeclarationContext):
+        if self.done:
+            return
+        self._class_stack.pop()
+
+    def enterFieldDeclaration(self, ctx: JavaParserLabeled.FieldDeclarationContext):
+        if self.done:
+            return
         if not self.is_source_class:
             return None
-        grand_parent_ctx = ctx.parentCtx.parentCtx
         # field_identifier = ctx.variableDeclarators().getText().split(",")
-        field_identifier = ctx.variableDeclarators().variableDeclarator(0).variableDeclaratorId().IDENTIFIER().getText()
-        if self.field_name in field_identifier:
-            if not (grand_parent_ctx.modifier() == []):
-                for i in range(0, len(grand_parent_ctx.modifier())):
-                    if grand_parent_ctx.modifier(i).getText() == "static":
-                        self.is_static = True
-                        break
-                if self.is_static:
-                    self.token_stream_rewriter.replaceRange(
-                        from_idx=grand_parent_ctx.modifier(i).start.tokenIndex,
-                        to_idx=grand_parent_ctx.modifier(i).stop.tokenIndex,
-                        text=''
-                    )
+        field_identifier = field_identifier_text(ctx)
+        if field_identifier == self.field_name:
+            self._modifier_tokens = [
+                (modifier.start.tokenIndex, modifier.stop.tokenIndex, modifier.getText())
+                for modifier in ctx.parentCtx.parentCtx.modifier()
+            ]
 
+    def exitFieldDeclaration(self, ctx: JavaParserLabeled.FieldDeclarationContext):
+        if self.done:
+            return
+        if self._modifier_tokens is None:
+            return None
+        for start_index, stop_index, modifier_text in self._modifier_tokens:
+            if modifier_text == "static":
+                self.is_static = True
+                self.token_stream_rewriter.replaceRange(
+                    from_idx=start_index,
+                    to_idx=stop_index,
+                    text=''
+                )
+                self.done = True
+                break
+        self._modifier_tokens = None
 
 def main(udb_path, source_class, field_name, *args, **kwargs):
-    main_file = None
-    db = und.open(udb_path)
-    for cls in db.ents("class"):
-        if cls.simplename() == source_class:
-            main_file = cls.parent().longname(True)
-            if not os.path.isfile(main_file):
-                continue
-    if main_file is None:
-        db.close()
+    main_file = class_file_map(udb_path).get(source_class)
+    if main_file is None or not os.path.isfile(main_file):
+        return
+
+    with open(main_file, 'rb') as f:
+        src = f.read()
+    if not (b'static' in src and field_name.encode() in src):
         return
 
-    stream = FileStream(main_file, encoding='utf8')
-    lexer = JavaLexer(stream)
-    token_stream = CommonTokenStream(lexer)
-    parser = JavaParserLabeled(token_stream)
-    parser.getTokenStream()
-    parse_tree = parser.compilationUnit()
-    my_listener = MakeFieldNonStaticRefactoringListener(common_token_stream=token_stream, source_class=source_class,
-                                                        field_name=field_name)
-    walker = ParseTreeWalker()
+    token_stream, parse_tree = get_parse_tree(main_file, source=src)
+    listener_class = build_listener(MakeFieldNonStaticRefactoringListener, source_class=source_class,
+                                    field_name=field_name)
+    my_listener = listener_class(common_token_stream=token_stream, source_class=source_class, field_name=field_name)
+    walker = EarlyExitParseTreeWalker()
     walker.walk(t=parse_tree, listener=my_listener)
 
-    with open(main_file, mode='w', newline='') as f:
-        f.write(my_listener.token_stream_rewriter.getDefaultText())
-    db.close()
+    write_back(main_file, token_stream, my_listener.token_stream_rewriter.getDefaultText())
 
 
 if __name__ == '__main__':
-    udb_path = "/home/ali/Desktop/code/TestProject/TestProject.udb"
-    source_class = "Website"
-    field_name = "HELLO_FROM_STUDENT_WEBSITE"
-    # initialize with understand
-    main(udb_path, source_class, field_name)
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('--udb', default="/home/ali/Desktop/code/TestProject/TestProject.udb")
+    argparser.add_argument('--batch', help='JSON list of {"class": ..., "field": ...} to refactor in parallel')
+    args = argparser.parse_args()
+    udb_path = args.udb
+    if args.batch:
+        apply_in_parallel(udb_path, load_batch(args.batch, "make_field_non_static"))
+    else:
+        source_class = "Website"
+        field_name = "HELLO_FROM_STUDENT_WEBSITE"
+        # initialize with understand
+        main(udb_path, source_class, field_name)
@@ -1,16 +1,18 @@
+import argparse
 import os
 
-from gen.javaLabeled.JavaLexer import JavaLexer
-
-try:
-    import understand as und
-except ImportError as e:
-    print(e)
 from antlr4 import *
 from antlr4.TokenStreamRewriter import TokenStreamRewriter
 
 from gen.javaLabeled.JavaParserLabeled import JavaParserLabeled
 from gen.javaLabeled.JavaParserLabeledListener import JavaParserLabeledListener
+from refactorings.utils.context_utils import ctx_identifier_text
+from refactorings.utils.batch import apply_in_parallel, load_batch
+from refactorings.utils.early_exit_walker import EarlyExitParseTreeWalker
+from refactorings.utils.listener_codegen import build_listener
+from refactorings.utils.offset_rewriter import OffsetRewriter
+from refactorings.utils.parse_cache import get_parse_tree, write_back
+from refactorings.utils.und_cache import class_file_map
 
 
 class MakeMethodStaticRefactoringListener(JavaParserLabeledListener):
@@ -19,7 +21,8 @@ class MakeMethodStaticRefactoringListener(JavaParserLabeledListener):
     Creates a new class and move fields and methods from the old class to the new one
     """
 
-    def __init__(self, common_token_stream: CommonTokenStream = None, source_class=None, method_name: str = None):
+    def __init__(self, common_token_stream: CommonTokenStream = None, source_class=None, method_name: str = None,
+                 rewriter: TokenStreamRewriter = None):
 
         if method_name is None:
             self.method_name = ""
@@ -30,82 +33,122 @@ class MakeMethodStaticRefactoringListener(JavaParserLabeledListener):
             self.source_class = ""
         else:
             self.source_class = source_class
-        if common_token_stream is None:
+        if rewriter is not None:
+            # shared with other listeners walking the same tree, see compound.py
+            self.token_stream_rewriter = rewriter
+        elif common_token_stream is None:
             raise ValueError('common_token_stream is None')
         else:
-            self.token_stream_rewriter = TokenStreamRewriter(common_token_stream)
+            self.token_stream_rewriter = OffsetRewriter(common_token_stream)
 
-        self.is_source_class = False
+        # names of the classes enclosing the current node, innermost last; None for anonymous class bodies
+        self._class_stack = []
         self.is_static = False
+        self.done = False
+        # the target method's declaration and the (start token index, stop token index, text) of its modifiers
+        self._target_ctx = None
+        self._modifier_tokens = None
 
-    def enterClassDeclaration(self, ctx: JavaParserLabeled.ClassDeclarationContext):
+    @property
+    def is_source_class(self):
+        return bool(self._class_stack) and self._class_stack[-1] == self.source_class
 
-        class_identifier = ctx.IDENTIFIER().getText()
-        if class_identifier == self.source_class:
-            self.is_source_class = True
-        else:
-            self.is_source_class = False
+    def enterClassDeclaration(self, ctx: JavaParserLabeled.ClassDeclarationContext):
+        if self.done:
+            return
+        self._class_stack.append(ctx_identifier_text(ctx))
+
+    def exitClassDeclaration(self, ctx: JavaParserLabeled.ClassDeclarationContext):
+        if self.done:
+            return
+        self._class_stack.pop()
+
+    def enterClassBody(self, ctx: JavaParserLabeled.ClassBodyContext):
+        if self.done:
+            return
+        if ctx.parentCtx.getRuleIndex() != JavaParserLabeled.RULE_classDeclaration:
+            self._class_stack.append(None)
+
+    def exitClassBody(self, ctx: JavaParserLabeled.ClassBodyContext):
+        if self.done:
+            return
+        if ctx.parentCtx.getRuleIndex() != JavaParserLabeled.RULE_classDeclaration:
+            self._class_stack.pop()
+
+    def enterMethodDeclaration(self, ctx: JavaParserLabeled.MethodDeclarationContext):
+        if self.done:
+            return
+        if not self.is_source_class:
+            return None
+        method_identifier = ctx_identifier_text(ctx)
+        if method_identifier == self.method_name and self._target_ctx is None:
+            self._target_ctx = ctx
+            self._modifier_tokens = [
+                (modifier.start.tokenIndex, modifier.stop.tokenIndex, modifier.getText())
+                for modifier in ctx.parentCtx.parentCtx.modifier()
+            ]
 
     def exitMethodDeclaration(self, ctx: JavaParserLabeled.MethodDeclarationContext):
-        if not self.is_source_class:
+        if self.done:
+            return
+        # methods of the local classes inside the target method exit before it
+        if ctx is not self._target_ctx:
             return None
-        grand_parent_ctx = ctx.parentCtx.parentCtx
-        method_identifier = ctx.IDENTIFIER().getText()
-        if self.method_name in method_identifier:
-            if grand_parent_ctx.modifier() == []:
+        modifiers = self._modifier_tokens
+        self._target_ctx = None
+        self._modifier_tokens = None
+        if not modifiers:
+            self.token_stream_rewriter.replaceRange(
+                from_idx=ctx.typeTypeOrVoid().start.tokenIndex,
+                to_idx=ctx.typeTypeOrVoid().stop.tokenIndex,
+                text='static ' + ctx.typeTypeOrVoid().getText()
+            )
+            self.done = True
+        else:
+            for _, _, modifier_text in modifiers:
+                if modifier_text == "static":
+                    self.is_static = True
+                    break
+            if not self.is_static:
+                start_index, stop_index, modifier_text = modifiers[0]
                 self.token_stream_rewriter.replaceRange(
-                    from_idx=ctx.typeTypeOrVoid().start.tokenIndex,
-                    to_idx=ctx.typeTypeOrVoid().stop.tokenIndex,
-                    text='static ' + ctx.typeTypeOrVoid().getText()
+                    from_idx=start_index,
+                    to_idx=stop_index,
+                    text=modifier_text + ' static'
                 )
-            else:
-                for i in range(0, len(grand_parent_ctx.modifier())):
-                    if grand_parent_ctx.modifier(i).getText() == "static":
-                        self.is_static = True
-                        break
-                if not self.is_static:
-                    self.token_stream_rewriter.replaceRange(
-                        from_idx=grand_parent_ctx.modifier(0).start.tokenIndex,
-                        to_idx=grand_parent_ctx.modifier(0).stop.tokenIndex,
-                        text=grand_parent_ctx.modifier(0).getText() + ' static'
-                    )
-
+                self.done = True
 
 def main(udb_path, source_class, method_name, *args, **kwargs):
-    main_file = ""
-    db = und.open(udb_path)
-    for cls in db.ents("class"):
-        if cls.simplename() == source_class:
-            main_file = cls.parent().longname(True)
-            if not os.path.isfile(main_file):
-                continue
-    if main_file is None:
-        db.close()
+    main_file = class_file_map(udb_path).get(source_class)
+    if main_file is None or not os.path.isfile(main_file):
         return
-    if not os.path.isfile(main_file):
-        db.close()
+
+    with open(main_file, 'rb') as f:
+        src = f.read()
+    if method_name.encode() not in src:
         return
 
-    stream = FileStream(main_file, encoding='utf8')
-    lexer = JavaLexer(stream)
-    token_stream = CommonTokenStream(lexer)
-    parser = JavaParserLabeled(token_stream)
-    parser.getTokenStream()
-    parse_tree = parser.compilationUnit()
-    my_listener = MakeMethodStaticRefactoringListener(common_token_stream=token_stream,
-                                                      source_class=source_class,
-                                                      method_name=method_name)
-    walker = ParseTreeWalker()
+    token_stream, parse_tree = get_parse_tree(main_file, source=src)
+    listener_class = build_listener(MakeMethodStaticRefactoringListener, source_class=source_class,
+                                    method_name=method_name)
+    my_listener = listener_class(common_token_stream=token_stream, source_class=source_class,
+                                 method_name=method_name)
+    walker = EarlyExitParseTreeWalker()
     walker.walk(t=parse_tree, listener=my_listener)
 
-    with open(main_file, mode='w', newline='') as f:
-        f.write(my_listener.token_stream_rewriter.getDefaultText())
-    db.close()
+    write_back(main_file, token_stream, my_listener.token_stream_rewriter.getDefaultText())
 
 
 if __name__ == '__main__':
-    udb_path = "/home/ali/Desktop/code/TestProject/TestProject.udb"
-    source_class = "App"
-    method_name = "testMethod"
-    # initialize with understand
-    main(udb_path, source_class, method_name)
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('--udb', default="/home/ali/Desktop/code/TestProject/TestProject.udb")
+    argparser.add_argument('--batch', help='JSON list of {"class": ..., "method": ...} to refactor in parallel')
+    args = argparser.parse_args()
+    udb_path = args.udb
+    if args.batch:
+        apply_in_parallel(udb_path, load_batch(args.batch, "make_method_static"))
+    else:
+        source_class = "App"
+        method_name = "testMethod"
+        # initialize with understand
+        main(udb_path, source_class, method_name)
@@ -1,15 +1,16 @@
+import functools
 import logging
-
-try:
-    import understand as und
-except ImportError as e:
-    print(e)
+from itertools import repeat
 
 from antlr4.TokenStreamRewriter import TokenStreamRewriter
 
 from gen.javaLabeled.JavaParserLabeled import JavaParserLabeled
 from gen.javaLabeled.JavaParserLabeledListener import JavaParserLabeledListener
 
+from refactorings.utils.batch import map_files
+from refactorings.utils.context_utils import ctx_identifier_text
+from refactorings.utils.listener_codegen import build_listener
+from refactorings.utils.und_cache import lookup, resolve_class
 from refactorings.utils.utils2 import parse_and_walk
 
 logger = logging.getLogger()
@@ -32,20 +33,28 @@ class CutFieldListener(JavaParserLabeledListener):
         self.field_name = field_name
         self.rewriter = rewriter
         self.field_content = ""
-        self.import_statements = ""
+        # import declarations of the source file, each followed by a newline
+        self._import_statements = []
 
         self.detected_field = False
-        self.is_source_class = False
+        # number of the declarations of the source class enclosing the current node
+        self._source_class_depth = 0
+
+    @property
+    def import_statements(self):
+        return "".join(self._import_statements)
+
+    @property
+    def is_source_class(self):
+        return self._source_class_depth > 0
 
     def enterClassDeclaration(self, ctx: JavaParserLabeled.ClassDeclarationContext):
-        class_name = ctx.IDENTIFIER().getText()
-        if class_name == self.source_class:
-            self.is_source_class = True
+        if ctx_identifier_text(ctx) == self.source_class:
+            self._source_class_depth += 1
 
     def exitClassDeclaration(self, ctx: JavaParserLabeled.ClassDeclarationContext):
-        class_name = ctx.IDENTIFIER().getText()
-        if self.is_source_class and class_name == self.source_class:
-            self.is_source_class = False
+        if self._source_class_depth and ctx_identifier_text(ctx) == self.source_class:
+            self._source_class_depth -= 1
 
     def enterImportDeclaration(self, ctx: JavaParserLabeled.ImportDeclarationContext):
         statement = self.rewriter.getText(
@@ -53,13 +62,11 @@ class CutFieldListener(JavaParserLabeledListener):
             start=ctx.start.tokenIndex,
             stop=ctx.stop.tokenIndex
         )
-        self.import_statements += statement + "\n"
+        self._import_statements.append(statement + "\n")
 
     def exitVariableDeclaratorId(self, ctx: JavaParserLabeled.VariableDeclaratorIdContext):
-        variable_name = ctx.IDENTIFIER().getText()
-        if self.is_source_class:
-            if variable_name == self.field_name:
-                self.detected_field = True
+        if self.is_source_class and ctx.IDENTIFIER().getText() == self.field_name:
+            self.detected_field = True
 
     def exitClassBodyDeclaration2(self, ctx: JavaParserLabeled.ClassBodyDeclaration2Context):
         if self.detected_field and self.is_source_class:
@@ -76,6 +83,39 @@ class CutFieldListener(JavaParserLabeledListener):
             self.detected_field = False
 
 
+class CutPasteFieldListener(CutFieldListener):
+    def __init__(self, source_class, field_name, target_class_names, rewriter: TokenStreamRewriter):
+        """
+        Moves the field declaration from the parent class to the children classes declared in the same file,
+        in one walk.
+
+        Args:
+            source_class: (str) Parent's class name.
+            field_name: (str) Field's name.
+            target_class_names: (list) Names of the children classes declared in the parent's file.
+            rewriter: Antlr's token stream rewriter.
+        Returns:
+            field_content: The full string of field declaration
+        """
+        super().__init__(source_class, field_name, rewriter)
+        self.target_class_names = target_class_names
+        # token indexes of the opening braces of the children class bodies
+        self.target_class_bodies = []
+
+    def enterClassBody(self, ctx: JavaParserLabeled.ClassBodyContext):
+        if ctx.parentCtx.getRuleIndex() == JavaParserLabeled.RULE_classDeclaration and \
+                ctx_identifier_text(ctx.parentCtx) in self.target_class_names:
+            self.target_class_bodies.append(ctx.start.tokenIndex)
+
+    def exitCompilationUnit(self, ctx: JavaParserLabeled.CompilationUnitContext):
+        # The field may be declared after the children classes, so it is pasted once the walk is done.
+        for index in self.target_class_bodies:
+            self.rewriter.insertAfter(
+                index=index,
+                text="\n\t" + self.field_content
+            )
+
+
 class PasteFieldListener(JavaParserLabeledListener):
     def __init__(self, source_class, field_content, import_statements, rewriter: TokenStreamRewriter):
         """
@@ -91,17 +131,20 @@ class PasteFieldListener(JavaParserLabeledListener):
         self.rewriter = rewriter
         self.field_content = field_content
         self.import_statements = import_statements
-        self.is_source_class = False
+        # number of the declarations of the source class enclosing the current node
+        self._source_class_depth = 0
+
+    @property
+    def is_source_class(self):
+        return self._source_class_depth > 0
 
     def enterClassDeclaration(self, ctx: JavaParserLabeled.ClassDeclarationContext):
-        class_name = ctx.IDENTIFIER().getText()
-        if class_name == self.source_class:
-            self.is_source_class = True
+        if ctx_identifier_text(ctx) == self.source_class:
+            self._source_class_depth += 1
 
     def exitClassDeclaration(self, ctx: JavaParserLabeled.ClassDeclarationContext):
-        class_name = ctx.IDENTIFIER().getText()
-        if self.is_source_class and class_name == self.source_class:
-            self.is_source_class = False
+        if self._source_class_depth and ctx_identifier_text(ctx) == self.source_class:
+            self._source_class_depth -= 1
 
     def exitPackageDeclaration(self, ctx: JavaParserLabeled.PackageDeclarationContext):
         self.rewriter.insertAfter(
@@ -118,64 +161,83 @@ class PasteFieldListener(JavaParserLabeledListener):
             )
 
 
-def main(udb_path, source_package, source_class, field_name, target_classes: list, *args, **kwargs):
-    db = und.open(udb_path)
-    source_class_ents = db.lookup(f"{source_package}.{source_class}", "Class")
-    target_class_ents = []
-    source_class_ent = None
+def _paste_field(file_path: str, class_names: list, field_content: str, import_statements: str):
+    """
+    Inserts the field declaration to the given children classes declared in one file.
+    """
+    for class_name in class_names:
+        parse_and_walk(
+            file_path=file_path,
+            listener_class=build_listener(PasteFieldListener, source_class=class_name),
+            has_write=True,
+            source_class=class_name,
+            field_content=field_content,
+            import_statements=import_statements,
+            debug=False
+        )
 
-    if len(source_class_ents) == 0:
-        logger.error(f"Cannot find source class: {source_class}")
-        return
-    else:
-        for ent in source_class_ents:
-            if ent.simplename() == source_class:
-                source_class_ent = ent
-                break
+
+def main(udb_path, source_package, source_class, field_name, target_classes: list, *args, executor=None,
+         **kwargs):
+    source_class_ent = resolve_class(udb_path, f"{source_package}.{source_class}")
+    target_class_ents = []
     if source_class_ent is None:
         logger.error(f"Cannot find source class: {source_class}")
         return
 
-    field_ent = db.lookup(f"{source_package}.{source_class}.{field_name}", "Variable")
+    field_ent = lookup(udb_path, f"{source_package}.{source_class}.{field_name}", "Variable")
     if len(field_ent) == 0:
         logger.error(f"Cannot find field to pushdown: {field_name}")
         return
     else:
         field_ent = field_ent[0]
 
+    target_class_set = frozenset(target_classes)
     for ref in source_class_ent.refs("extendBy"):
-        if ref.ent().simplename() not in target_classes:
+        if ref.ent().simplename() not in target_class_set:
             logger.error("Target classes are not children classes")
             return
         target_class_ents.append(ref.ent())
 
     for ref in field_ent.refs("useBy, setBy"):
-        if ref.file().simplename().split(".")[0] in target_classes:
+        if ref.file().simplename().partition(".")[0] in target_class_set:
             continue
         else:
             logger.error("Field has dependencies.")
             return
             # Remove field from source class
+    target_classes_by_file = {}
+    for target_class in target_class_ents:
+        target_classes_by_file.setdefault(target_class.parent().longname(), []).append(target_class.simplename())
+    # The children classes declared in the parent's file are updated in the same walk
+    source_file = source_class_ent.parent().longname()
+    same_file_target_names = target_classes_by_file.pop(source_file, [])
+    if same_file_target_names:
+        cut_listener_class = functools.partial(
+            build_listener(CutPasteFieldListener, source_class=source_class, field_name=field_name),
+            target_class_names=same_file_target_names
+        )
+    else:
+        cut_listener_class = build_listener(CutFieldListener, source_class=source_class, field_name=field_name)
     listener = parse_and_walk(
-        file_path=source_class_ent.parent().longname(),
-        listener_class=CutFieldListener,
+        file_path=source_file,
+        listener_class=cut_listener_class,
         has_write=True,
         source_class=source_class,
         field_name=field_name,
         debug=False
     )
     # Insert field in children classes
-    for target_class in target_class_ents:
-        parse_and_walk(
-            file_path=target_class.parent().longname(),
-            listener_class=PasteFieldListener,
-            has_write=True,
-            source_class=target_class.simplename(),
-            field_content=listener.field_content,
-            import_statements=listener.import_statements,
-            debug=False
-        )
-    db.close()
+    # The files of the children classes are independent, so many of them are rewritten on worker processes.
+    map_files(
+        _paste_field,
+        target_classes_by_file.keys(),
+        target_classes_by_file.values(),
+        repeat(listener.field_content),
+        repeat(listener.import_statements),
+        file_count=len(target_classes_by_file),
+        executor=executor
+    )
 
 
 if __name__ == '__main__':
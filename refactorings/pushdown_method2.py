@@ -1,15 +1,16 @@
+import functools
 import logging
-
-try:
-    import understand as und
-except ImportError as e:
-    print(e)
+from itertools import repeat
 
 from antlr4.TokenStreamRewriter import TokenStreamRewriter
 
 from gen.javaLabeled.JavaParserLabeled import JavaParserLabeled
 from gen.javaLabeled.JavaParserLabeledListener import JavaParserLabeledListener
 
+from refactorings.utils.batch import map_files
+from refactorings.utils.context_utils import ctx_identifier_text
+from refactorings.utils.listener_codegen import build_listener
+from refactorings.utils.und_cache import lookup, resolve_class
 from refactorings.utils.utils2 import parse_and_walk
 
 logger = logging.getLogger()
@@ -32,20 +33,28 @@ class CutMethodListener(JavaParserLabeledListener):
         self.method_name = method_name
         self.rewriter = rewriter
         self.method_content = ""
-        self.import_statements = ""
+        # import declarations of the source file, each followed by a newline
+        self._import_statements = []
 
         self.detected_method = False
-        self.is_source_class = False
+        # number of the declarations of the source class enclosing the current node
+        self._source_class_depth = 0
+
+    @property
+    def import_statements(self):
+        return "".join(self._import_statements)
+
+    @property
+    def is_source_class(self):
+        return self._source_class_depth > 0
 
     def enterClassDeclaration(self, ctx: JavaParserLabeled.ClassDeclarationContext):
-        class_name = ctx.IDENTIFIER().getText()
-        if class_name == self.source_class:
-            self.is_source_class = True
+        if ctx_identifier_text(ctx) == self.source_class:
+            self._source_class_depth += 1
 
     def exitClassDeclaration(self, ctx: JavaParserLabeled.ClassDeclarationContext):
-        class_name = ctx.IDENTIFIER().getText()
-        if self.is_source_class and class_name == self.source_class:
-            self.is_source_class = False
+        if self._source_class_depth and ctx_identifier_text(ctx) == self.source_class:
+            self._source_class_depth -= 1
 
     def enterImportDeclaration(self, ctx: JavaParserLabeled.ImportDeclarationContext):
         statement = self.rewriter.getText(
@@ -53,7 +62,7 @@ class CutMethodListener(JavaParserLabeledListener):
             start=ctx.start.tokenIndex,
             stop=ctx.stop.tokenIndex
         )
-        self.import_statements += statement + "\n"
+        self._import_statements.append(statement + "\n")
 
     def exitMethodDeclaration(self, ctx: JavaParserLabeled.MethodDeclarationContext):
         if self.is_source_class and ctx.IDENTIFIER().getText() == self.method_name:
@@ -74,6 +83,40 @@ class CutMethodListener(JavaParserLabeledListener):
             self.detected_method = False
 
 
+class CutPasteMethodListener(CutMethodListener):
+    def __init__(self, source_class, method_name, target_class_names, rewriter: TokenStreamRewriter):
+        """
+        Moves the method declaration from the parent class to the children classes declared in the same file,
+        in one walk.
+
+        Args:
+            source_class: (str) Parent's class name.
+            method_name: (str) Method's name.
+            target_class_names: (list) Names of the children classes declared in the parent's file.
+            rewriter: Antlr's token stream rewriter.
+        Returns:
+            method_content: The full string of method declaration
+        """
+        super().__init__(source_class, method_name, rewriter)
+        self.target_class_names = target_class_names
+        # token indexes of the closing braces of the children class bodies
+        self.target_class_bodies = []
+
+    def enterClassBody(self, ctx: JavaParserLabeled.ClassBodyContext):
+        if ctx.parentCtx.getRuleIndex() == JavaParserLabeled.RULE_classDeclaration and \
+                ctx_identifier_text(ctx.parentCtx) in self.target_class_names:
+            self.target_class_bodies.append(ctx.stop.tokenIndex)
+
+    def exitCompilationUnit(self, ctx: JavaParserLabeled.CompilationUnitContext):
+        # The method may be declared after the children classes, so it is pasted once the walk is done.
+        for index in self.target_class_bodies:
+            self.rewriter.insertBefore(
+                program_name=self.rewriter.DEFAULT_PROGRAM_NAME,
+                index=index,
+                text="\n\t" + self.method_content + "\n"
+            )
+
+
 class PasteMethodListener(JavaParserLabeledListener):
     def __init__(self, source_class, method_content, import_statements, rewriter: TokenStreamRewriter):
         """
@@ -89,17 +132,20 @@ class PasteMethodListener(JavaParserLabeledListener):
         self.rewriter = rewriter
         self.method_content = method_content
         self.import_statements = import_statements
-        self.is_source_class = False
+        # number of the declarations of the source class enclosing the current node
+        self._source_class_depth = 0
+
+    @property
+    def is_source_class(self):
+        return self._source_class_depth > 0
 
     def enterClassDeclaration(self, ctx: JavaParserLabeled.ClassDeclarationContext):
-        class_name = ctx.IDENTIFIER().getText()
-        if class_name == self.source_class:
-            self.is_source_class = True
+        if ctx_identifier_text(ctx) == self.source_class:
+            self._source_class_depth += 1
 
     def exitClassDeclaration(self, ctx: JavaParserLabeled.ClassDeclarationContext):
-        class_name = ctx.IDENTIFIER().getText()
-        if self.is_source_class and class_name == self.source_class:
-            self.is_source_class = False
+        if self._source_class_depth and ctx_identifier_text(ctx) == self.source_class:
+            self._source_class_depth -= 1
 
     def exitPackageDeclaration(self, ctx: JavaParserLabeled.PackageDeclarationContext):
         self.rewriter.insertAfter(
@@ -117,65 +163,84 @@ class PasteMethodListener(JavaParserLabeledListener):
             )
 
 
-def main(udb_path, source_package, source_class, method_name, target_classes: list, *args, **kwargs):
-    db = und.open(udb_path)
-    source_class_ents = db.lookup(f"{source_package}.{source_class}", "Class")
-    target_class_ents = []
-    source_class_ent = None
+def _paste_method(file_path: str, class_names: list, method_content: str, import_statements: str):
+    """
+    Inserts the method declaration to the given children classes declared in one file.
+    """
+    for class_name in class_names:
+        parse_and_walk(
+            file_path=file_path,
+            listener_class=build_listener(PasteMethodListener, source_class=class_name),
+            has_write=True,
+            source_class=class_name,
+            method_content=method_content,
+            import_statements=import_statements,
+            debug=False
+        )
 
-    if len(source_class_ents) == 0:
-        logger.error(f"Cannot find source class: {source_class}")
-        return
-    else:
-        for ent in source_class_ents:
-            if ent.simplename() == source_class:
-                source_class_ent = ent
-                break
+
+def main(udb_path, source_package, source_class, method_name, target_classes: list, *args, executor=None,
+         **kwargs):
+    source_class_ent = resolve_class(udb_path, f"{source_package}.{source_class}")
+    target_class_ents = []
     if source_class_ent is None:
         logger.error(f"Cannot find source class: {source_class}")
         return
 
-    method_ent = db.lookup(f"{source_package}.{source_class}.{method_name}", "Method")
+    method_ent = lookup(udb_path, f"{source_package}.{source_class}.{method_name}", "Method")
     if len(method_ent) == 0:
         logger.error(f"Cannot find method to pushdown: {method_name}")
         return
     else:
         method_ent = method_ent[0]
 
+    target_class_set = frozenset(target_classes)
     for ref in source_class_ent.refs("extendBy"):
-        if ref.ent().simplename() not in target_classes:
+        if ref.ent().simplename() not in target_class_set:
             logger.error("Target classes are not children classes")
             return
         target_class_ents.append(ref.ent())
 
     for ref in method_ent.refs("callBy"):
-        if ref.file().simplename().split(".")[0] in target_classes:
+        if ref.file().simplename().partition(".")[0] in target_class_set:
             continue
         else:
             logger.error("Method has dependencies.")
             return
 
     # Remove field from source class
+    target_classes_by_file = {}
+    for target_class in target_class_ents:
+        target_classes_by_file.setdefault(target_class.parent().longname(), []).append(target_class.simplename())
+    # The children classes declared in the parent's file are updated in the same walk
+    source_file = source_class_ent.parent().longname()
+    same_file_target_names = target_classes_by_file.pop(source_file, [])
+    if same_file_target_names:
+        cut_listener_class = functools.partial(
+            build_listener(CutPasteMethodListener, source_class=source_class, method_name=method_name),
+            target_class_names=same_file_target_names
+        )
+    else:
+        cut_listener_class = build_listener(CutMethodListener, source_class=source_class, method_name=method_name)
     listener = parse_and_walk(
-        file_path=source_class_ent.parent().longname(),
-        listener_class=CutMethodListener,
+        file_path=source_file,
+        listener_class=cut_listener_class,
         has_write=True,
         source_class=source_class,
         method_name=method_name,
         debug=False
     )
     # Insert field in children classes
-    for target_class in target_class_ents:
-        parse_and_walk(
-            file_path=target_class.parent().longname(),
-            listener_class=PasteMethodListener,
-            has_write=True,
-            source_class=target_class.simplename(),
-            method_content=listener.method_content,
-            import_statements=listener.import_statements,
-            debug=False
-        )
-    db.close()
+    # The files of the children classes are independent, so many of them are rewritten on worker processes.
+    map_files(
+        _paste_method,
+        target_classes_by_file.keys(),
+        target_classes_by_file.values(),
+        repeat(listener.method_content),
+        repeat(listener.import_statements),
+        file_count=len(target_classes_by_file),
+        executor=executor
+    )
 
 
 if __name__ == '__main__':
@@ -0,0 +1,122 @@
+"""
+Applies a batch of refactorings, e.g., the output of a refactoring recommender, on several processes.
+
+The operations are grouped by the file declaring their class: the operations on one file are applied
+together with `compound.apply_batch` (one parse, one walk and one write), and different files are
+refactored in parallel. Processes are used instead of threads since the ANTLR runtime is pure Python.
+The worker processes are shared by all the refactorings of a process, see `shared_executor`.
+
+Each operation is a dict in the format of `compound.apply_batch`, e.g.,
+
+    {"kind": "make_field_non_static", "class": "Website", "field": "HELLO_FROM_STUDENT_WEBSITE"}
+
+"""
+
+import atexit
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from refactorings.utils.und_cache import class_file_map
+
+# the smallest number of files which is worth sending to the worker processes
+PARALLEL_MIN_FILES = 4
+
+_executor = None
+
+
+def shared_executor() -> ProcessPoolExecutor:
+    """
+    Returns the process pool shared by the refactorings of this process, creating it on first use.
+    Starting the workers and importing the parser in them costs more than rewriting a few files,
+    so the pool is kept until the process exits instead of being created per call.
+
+    :return: A `ProcessPoolExecutor`
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor()
+        atexit.register(_executor.shutdown)
+    return _executor
+
+
+def map_files(function, *iterables, file_count: int, executor: ProcessPoolExecutor = None) -> list:
+    """
+    Returns `list(map(function, *iterables))`, computed on worker processes when there are enough files.
+    The function must be picklable, i.e., defined at module level.
+
+    :param function: A function rewriting one file.
+    :param iterables: The arguments of the function, one item per file.
+    :param file_count: The number of files.
+    :param executor: The pool to use; by default, `shared_executor()` for at least `PARALLEL_MIN_FILES`
+                     files, and the calling process otherwise.
+    :return: The list of results
+    """
+    if executor is None:
+        if file_count < PARALLEL_MIN_FILES:
+            return list(map(function, *iterables))
+        executor = shared_executor()
+    return list(executor.map(function, *iterables))
+
+
+def _apply_file(main_file: str, ops: list):
+    from refactorings.compound import apply_batch
+    return apply_batch(main_file, ops)
+
+
+def group_by_file(udb_path: str, ops: list) -> dict:
+    """
+    Groups the operations by the path of the file declaring their class.
+    Operations on classes which are not found in the database are dropped.
+
+    :param udb_path: The path of understand database.
+    :param ops: A list of operations.
+    :return: A dict of {file path: list of operations}
+    """
+    class_files = class_file_map(udb_path)
+    ops_by_file = {}
+    for op in ops:
+        main_file = class_files.get(op["class"])
+        if main_file is None or not os.path.isfile(main_file):
+            continue
+        ops_by_file.setdefault(main_file, []).append(op)
+    return ops_by_file
+
+
+def apply_in_parallel(udb_path: str, ops: list, max_workers: int = None) -> dict:
+    """
+    Applies the operations, refactoring different files in parallel.
+
+    :param udb_path: The path of understand database.
+    :param ops: A list of operations.
+    :param max_workers: The number of worker processes; by default, the shared pool is used.
+    :return: A dict of {file path: True if the file was changed}
+    """
+    ops_by_file = group_by_file(udb_path, ops)
+    if len(ops_by_file) <= 1 or max_workers == 1:
+        return {main_file: _apply_file(main_file, file_ops) for main_file, file_ops in ops_by_file.items()}
+    if max_workers is None:
+        changed = map_files(_apply_file, ops_by_file.keys(), ops_by_file.values(), file_count=len(ops_by_file))
+        return dict(zip(ops_by_file, changed))
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            main_file: executor.submit(_apply_file, main_file, file_ops)
+            for main_file, file_ops in ops_by_file.items()
+        }
+        return {main_file: future.result() for main_file, future in futures.items()}
+
+
+def load_batch(batch_path: str, default_kind: str) -> list:
+    """
+    Reads a JSON list of operations; operations without a `kind` get `default_kind`.
+
+    :param batch_path: The path of JSON file.
+    :param default_kind: The refactoring kind of the calling script.
+    :return: A list of operations
+    """
+    with open(batch_path) as f:
+        ops = json.load(f)
+    for op in ops:
+        op.setdefault("kind", default_kind)
+    return ops
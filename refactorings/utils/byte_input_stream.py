@@ -0,0 +1,57 @@
+"""
+Input streams built from the raw bytes of Java files.
+
+ANTLR's `InputStream` turns its text into a list of code points with a Python loop, and the lexer
+reads the code points one by one. Java sources are almost always ASCII, and indexing the `bytes`
+of an ASCII file already yields its code points, so `ByteInputStream` uses the bytes as is and
+decodes the text with a single C call. Files with non-ASCII characters fall back to `InputStream`.
+
+Example:
+
+    stream = file_input_stream(path)
+    lexer = JavaLexer(stream)
+
+"""
+
+from antlr4 import InputStream
+
+
+class ByteInputStream(InputStream):
+
+    def __init__(self, source: bytes):
+        """
+        :param source: The content of an ASCII file.
+        :raises UnicodeDecodeError: If the source has non-ASCII bytes.
+        """
+        self.name = "<empty>"
+        self.strdata = source.decode('ascii')
+        self._index = 0
+        self.data = source
+        self._size = len(source)
+
+
+def input_stream(source: bytes, name: str = "<empty>") -> InputStream:
+    """
+    Returns an input stream over the given UTF-8 source.
+
+    :param source: The content of a Java file.
+    :param name: The name of the stream, usually the file path.
+    :return: A `ByteInputStream` for ASCII sources, an `InputStream` otherwise
+    """
+    try:
+        stream = ByteInputStream(source)
+    except UnicodeDecodeError:
+        stream = InputStream(source.decode('utf8'))
+    stream.name = name
+    return stream
+
+
+def file_input_stream(path: str) -> InputStream:
+    """
+    Reads the given Java file into an input stream, as `FileStream(path, encoding='utf8')` does.
+
+    :param path: The path of Java file.
+    :return: An input stream
+    """
+    with open(path, 'rb') as f:
+        return input_stream(f.read(), path)
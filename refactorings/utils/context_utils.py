@@ -0,0 +1,33 @@
+"""
+Memoized accessors of parse tree contexts.
+
+Parse trees are kept alive by `parse_cache` across refactorings, so the texts which the
+listeners compare on every visit are computed once and stored on the context nodes.
+"""
+
+
+def ctx_identifier_text(ctx) -> str:
+    """
+    Returns the text of the `IDENTIFIER` child of the given context, e.g., the name of a class or a method.
+
+    :param ctx: A parser rule context having an `IDENTIFIER` child.
+    :return: The identifier text
+    """
+    text = getattr(ctx, '_identifier_text', None)
+    if text is None:
+        text = ctx._identifier_text = ctx.IDENTIFIER().getText()
+    return text
+
+
+def field_identifier_text(ctx) -> str:
+    """
+    Returns the name of the first variable declared by a field declaration.
+
+    :param ctx: A `FieldDeclarationContext`.
+    :return: The field name
+    """
+    text = getattr(ctx, '_identifier_text', None)
+    if text is None:
+        identifier = ctx.variableDeclarators().variableDeclarator(0).variableDeclaratorId().IDENTIFIER()
+        text = ctx._identifier_text = identifier.getText()
+    return text
@@ -0,0 +1,80 @@
+"""
+Process-wide pool of open Understand databases.
+
+Opening an Understand database is expensive, so refactorings applied one after another on the same
+project share one handle per database. A handle is reopened when the database file changes on disk,
+e.g., after `und analyze`, and all handles are closed when the process exits.
+
+Modules caching results read through a pooled handle register a callback with `on_close`,
+so the results are dropped together with the handle they came from.
+"""
+
+import atexit
+import os
+
+from refactorings.utils.und_loader import understand
+
+# udb_path -> (mtime, db)
+_open_dbs = {}
+# callbacks taking the udb_path of a handle which is closed
+_close_callbacks = []
+
+
+def on_close(callback):
+    """
+    Registers a function to be called with the path of a database whenever its pooled handle is closed,
+    i.e., on `close_db`, before a reopen and at exit.
+
+    :param callback: A function taking the udb_path.
+    :return: The callback, so this can be used as a decorator
+    """
+    _close_callbacks.append(callback)
+    return callback
+
+
+def _close(udb_path: str, db):
+    for callback in _close_callbacks:
+        callback(udb_path)
+    db.close()
+
+
+def get_db(udb_path: str):
+    """
+    Returns an open handle of the given database; the caller must not close it.
+
+    :param udb_path: The path of understand database.
+    :return: An `understand.Db`
+    """
+    mtime = os.path.getmtime(udb_path)
+    entry = _open_dbs.get(udb_path)
+    if entry is not None:
+        if entry[0] == mtime:
+            return entry[1]
+        _close(udb_path, entry[1])
+    db = understand().open(udb_path)
+    _open_dbs[udb_path] = (mtime, db)
+    return db
+
+
+def close_db(udb_path: str):
+    """
+    Closes the pooled handle of the given database, if any, e.g., before the database is re-analyzed.
+
+    :param udb_path: The path of understand database.
+    :return: None
+    """
+    entry = _open_dbs.pop(udb_path, None)
+    if entry is not None:
+        _close(udb_path, entry[1])
+
+
+@atexit.register
+def close_all():
+    """
+    Closes all pooled database handles.
+
+    :return: None
+    """
+    while _open_dbs:
+        udb_path, (_, db) = _open_dbs.popitem()
+        _close(udb_path, db)
@@ -0,0 +1,70 @@
+"""
+A parse tree walker that resolves the listener hooks of each rule context type once.
+
+ANTLR's walker calls `enterEveryRule`, `ctx.enterRule(listener)` and the matching exit methods on
+every node, and most of these calls land on the empty methods of the generated listener. This
+walker builds, per listener class, a table of {context type: (enter hook, exit hook)} holding only
+the hooks overridden by the listener, and skips the others. As in the generated `enterRule` methods,
+the hooks are looked up by the name of the context class.
+"""
+
+from antlr4 import ParseTreeWalker
+from antlr4.tree.Tree import ErrorNode, ParseTreeListener, TerminalNode
+
+# listener type -> {context type: (enterEveryRule, enter hook, exit hook, exitEveryRule)}
+_dispatch_tables = {}
+
+
+def _resolve(listener_type, name: str):
+    """
+    Returns the listener's method with the given name, or None if only a no-op of the generated listener
+    or of `ParseTreeListener` (e.g., `enterEveryRule`) exists.
+    """
+    function = getattr(listener_type, name, None)
+    if function is None or function is getattr(ParseTreeListener, name, None) or \
+            getattr(function, "__module__", "").startswith("gen."):
+        return None
+    return function
+
+
+def rule_hooks(listener_type, context_type):
+    """
+    Returns the (enterEveryRule, enter, exit, exitEveryRule) hooks of the listener type for the
+    context type, each one None if the listener does not override it.
+    """
+    table = _dispatch_tables.get(listener_type)
+    if table is None:
+        table = _dispatch_tables[listener_type] = {}
+    handlers = table.get(context_type)
+    if handlers is None:
+        # Generated contexts dispatch to the hooks named after them, e.g., `XxxContext` to `enterXxx`.
+        rule_name = context_type.__name__[:-len("Context")]
+        handlers = table[context_type] = (
+            _resolve(listener_type, "enterEveryRule"),
+            _resolve(listener_type, "enter" + rule_name),
+            _resolve(listener_type, "exit" + rule_name),
+            _resolve(listener_type, "exitEveryRule"),
+        )
+    return handlers
+
+
+class DispatchCachingParseTreeWalker(ParseTreeWalker):
+
+    def walk(self, listener, t):
+        if isinstance(t, ErrorNode):
+            listener.visitErrorNode(t)
+            return
+        elif isinstance(t, TerminalNode):
+            listener.visitTerminal(t)
+            return
+        enter_every_rule, enter, exit_, exit_every_rule = rule_hooks(type(listener), type(t))
+        if enter_every_rule is not None:
+            enter_every_rule(listener, t)
+        if enter is not None:
+            enter(listener, t)
+        for child in t.getChildren():
+            self.walk(listener, child)
+        if exit_ is not None:
+            exit_(listener, t)
+        if exit_every_rule is not None:
+            exit_every_rule(listener, t)
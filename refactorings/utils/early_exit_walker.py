@@ -0,0 +1,37 @@
+"""
+A parse tree walker that stops once the listener has finished its work.
+
+Listeners which rewrite a single target (a class, a field or a method) set
+``self.done = True`` right after the rewrite; the walker then neither descends
+into the remaining subtrees nor fires their enter/exit events. As in
+`DispatchCachingParseTreeWalker`, only the hooks overridden by the listener are called.
+"""
+
+from antlr4.tree.Tree import ErrorNode, TerminalNode
+
+from refactorings.utils.dispatch_walker import DispatchCachingParseTreeWalker, rule_hooks
+
+
+class EarlyExitParseTreeWalker(DispatchCachingParseTreeWalker):
+
+    def walk(self, listener, t):
+        if getattr(listener, "done", False):
+            return
+        if isinstance(t, ErrorNode):
+            listener.visitErrorNode(t)
+            return
+        elif isinstance(t, TerminalNode):
+            listener.visitTerminal(t)
+            return
+        enter_every_rule, enter, exit_, exit_every_rule = rule_hooks(type(listener), type(t))
+        if enter_every_rule is not None:
+            enter_every_rule(listener, t)
+        if enter is not None:
+            enter(listener, t)
+        for child in t.getChildren():
+            self.walk(listener, child)
+        if not getattr(listener, "done", False):
+            if exit_ is not None:
+                exit_(listener, t)
+            if exit_every_rule is not None:
+                exit_every_rule(listener, t)
@@ -0,0 +1,20 @@
+# Cython declarations of fast_rewriter.py, used when setup.py compiles it.
+
+cimport cython
+
+
+@cython.locals(indexes=list, byte_index=Py_ssize_t, last_byte=Py_ssize_t, chunk=bytearray, stripped=bytearray,
+               byte=long, base=Py_ssize_t, bit=Py_ssize_t, index=Py_ssize_t)
+cpdef list _set_bits(bytearray bits, Py_ssize_t start, Py_ssize_t stop)
+
+
+@cython.locals(parts=list, i=Py_ssize_t, index=Py_ssize_t)
+cpdef str _assemble(list texts, dict index_to_op, Py_ssize_t start, Py_ssize_t stop)
+
+
+cpdef object _writable(list ops, bytearray copied, Py_ssize_t i)
+
+
+@cython.locals(ops=list, copied=bytearray, alive=list, insert_bits=bytearray, inserts_at=dict, replace_starts=list, replaces=list,
+               last_insert_at=dict, reduced=dict, i=Py_ssize_t, k=Py_ssize_t, index=Py_ssize_t)
+cpdef dict _reduce(list rewrites, Py_ssize_t token_count)
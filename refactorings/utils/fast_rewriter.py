@@ -0,0 +1,221 @@
+"""
+A drop-in replacement of ANTLR's `TokenStreamRewriter` for large files and many rewrite operations.
+
+The runtime's `_reduceToSingleOperationPerIndex` compares every rewrite operation with all the
+operations recorded before it, which is quadratic in the number of operations. Here, the
+pending insertions are tracked in a bitmap indexed by token position and the replacements in a
+list sorted by their start index, so each operation only looks at the tokens it covers.
+Unlike the runtime, the reduction works on copies and leaves the recorded program untouched,
+so `getText` can be called several times on the same rewriter.
+
+The output is assembled by joining slices of a cached list of token texts, instead of writing
+every token to a `StringIO`.
+
+The reduction and the assembly are module level functions typed in `fast_rewriter.pxd`, so
+setup.py can compile this module with Cython; it runs as pure Python otherwise.
+"""
+
+import bisect
+import copy
+
+from antlr4.Token import Token
+from antlr4.TokenStreamRewriter import TokenStreamRewriter
+
+
+def _set_bits(bits: bytearray, start: int, stop: int):
+    """
+    Returns the indexes of the bits set in the closed interval [start, stop].
+    """
+    indexes = []
+    byte_index = start >> 3
+    last_byte = stop >> 3
+    while byte_index <= last_byte:
+        chunk = bits[byte_index:last_byte + 1]
+        stripped = chunk.lstrip(b'\x00')
+        if not stripped:
+            break
+        byte_index += len(chunk) - len(stripped)
+        byte = bits[byte_index]
+        base = byte_index << 3
+        bit = 0
+        while byte:
+            if byte & 1:
+                index = base + bit
+                if start <= index <= stop:
+                    indexes.append(index)
+            byte >>= 1
+            bit += 1
+        byte_index += 1
+    return indexes
+
+
+def _assemble(texts: list, index_to_op: dict, start: int, stop: int):
+    """
+    Returns the text of tokens[start, stop] with the reduced operations applied.
+    """
+    parts = []
+    i = start
+    for index in sorted(index_to_op):
+        if index < i:
+            continue
+        if index > stop:
+            break
+        parts.extend(texts[i:index])
+        op = index_to_op.pop(index)
+        if isinstance(op, TokenStreamRewriter.ReplaceOp):
+            if op.text:
+                parts.append(op.text)
+            i = op.last_index + 1
+        else:
+            parts.append(op.text)
+            parts.append(texts[index])
+            i = index + 1
+    parts.extend(texts[i:stop + 1])
+
+    if stop == len(texts) - 1:
+        for op in index_to_op.values():
+            if op.index >= len(texts) - 1:
+                parts.append(op.text)
+
+    return "".join(parts)
+
+
+def _writable(ops: list, copied: bytearray, i: int):
+    """
+    Returns ops[i] for changing it, after replacing it with a copy the first time.
+    """
+    if not copied[i]:
+        ops[i] = copy.copy(ops[i])
+        copied[i] = 1
+    return ops[i]
+
+
+def _reduce(rewrites: list, token_count: int):
+    """
+    Returns the rewrite operations reduced to a single one per token index, as {token index: operation}.
+    The operations that are changed by the reduction are copied first, so the given ones are left untouched.
+    """
+    ops = list(rewrites)
+    copied = bytearray(len(ops))
+    alive = [op is not None for op in ops]
+
+    insert_bits = bytearray((token_count >> 3) + 2)
+    inserts_at = {}  # token index -> positions of pending inserts, in instruction order
+    replace_starts = []  # start indexes of live replaces, sorted
+    replaces = []  # positions of live replaces, in the same order as replace_starts
+
+    # Walk replaces
+    for i, op in enumerate(ops):
+        if op is None:
+            continue
+        if isinstance(op, TokenStreamRewriter.InsertBeforeOp):
+            if op.index >= len(insert_bits) << 3:
+                insert_bits.extend(bytes((op.index >> 3) + 1 - len(insert_bits)))
+            inserts_at.setdefault(op.index, []).append(i)
+            insert_bits[op.index >> 3] |= 1 << (op.index & 7)
+            continue
+        if not isinstance(op, TokenStreamRewriter.ReplaceOp):
+            continue
+        rop = op
+        # Wipe prior inserts within range
+        for index in _set_bits(insert_bits, rop.index, rop.last_index):
+            for j in inserts_at.pop(index):
+                if index == rop.index:
+                    rop = _writable(ops, copied, i)
+                    rop.text = (ops[j].text or '') + (rop.text or '')
+                alive[j] = False
+            insert_bits[index >> 3] &= ~(1 << (index & 7))
+
+        # Drop any prior replaces contained within
+        k = bisect.bisect_right(replace_starts, rop.last_index) - 1
+        while k >= 0 and ops[replaces[k]].last_index >= rop.index:
+            prev_rop = ops[replaces[k]]
+            if prev_rop.index >= rop.index and prev_rop.last_index <= rop.last_index:
+                alive[replaces[k]] = False
+            elif prev_rop.text is None and rop.text is None:
+                alive[replaces[k]] = False
+                rop = _writable(ops, copied, i)
+                rop.index = min(prev_rop.index, rop.index)
+                rop.last_index = max(prev_rop.last_index, rop.last_index)
+            else:
+                raise ValueError("replace op boundaries of {}..{} overlap with previous {}..{}".format(
+                    rop.index, rop.last_index, prev_rop.index, prev_rop.last_index))
+            del replace_starts[k]
+            del replaces[k]
+            k -= 1
+        k = bisect.bisect_right(replace_starts, rop.index)
+        replace_starts.insert(k, rop.index)
+        replaces.insert(k, i)
+
+    # Walk inserts
+    last_insert_at = {}  # token index -> position of the insert combining all prior ones
+    for i, op in enumerate(ops):
+        if not alive[i] or not isinstance(op, TokenStreamRewriter.InsertBeforeOp):
+            continue
+        iop = op
+        j = last_insert_at.pop(iop.index, None)
+        if j is not None:
+            iop = _writable(ops, copied, i)
+            prev_iop = ops[j]
+            if type(prev_iop) is TokenStreamRewriter.InsertAfterOp:
+                iop.text = prev_iop.text + iop.text
+            else:
+                iop.text = iop.text + prev_iop.text
+            alive[j] = False
+        # look for replaces where iop.index is in range
+        k = bisect.bisect_right(replace_starts, iop.index) - 1
+        if k >= 0 and ops[replaces[k]].last_index >= iop.index:
+            rop = ops[replaces[k]]
+            if iop.index == rop.index:
+                rop = _writable(ops, copied, replaces[k])
+                rop.text = iop.text + (rop.text or '')
+                alive[i] = False
+                continue
+            raise ValueError("insert op at {} within boundaries of previous {}..{}".format(
+                iop.index, rop.index, rop.last_index))
+        last_insert_at[iop.index] = i
+
+    reduced = {}
+    for i, op in enumerate(ops):
+        if not alive[i]:
+            continue
+        if op.index in reduced:
+            raise ValueError('should be only one op per index')
+        reduced[op.index] = op
+    return reduced
+
+
+class FastTokenStreamRewriter(TokenStreamRewriter):
+
+    def __init__(self, tokens):
+        super().__init__(tokens)
+        self._token_texts = None
+
+    def _get_token_texts(self):
+        tokens = self.tokens.tokens
+        if self._token_texts is None or len(self._token_texts) != len(tokens):
+            self._token_texts = ["" if token.type == Token.EOF else token.text for token in tokens]
+        return self._token_texts
+
+    def getText(self, program_name, start: int, stop: int):
+        """
+        :return: the text in tokens[start, stop](closed interval)
+        """
+        texts = self._get_token_texts()
+
+        # ensure start/end are in range
+        if stop > len(texts) - 1:
+            stop = len(texts) - 1
+        if start < 0:
+            start = 0
+
+        rewrites = self.programs.get(program_name)
+        # if no instructions to execute
+        if not rewrites:
+            return "".join(texts[start:stop + 1])
+
+        index_to_op = self._reduceToSingleOperationPerIndex(rewrites)
+        return _assemble(texts, index_to_op, start, stop)
+
+    def _reduceToSingleOperationPerIndex(self, rewrites):
+        return _reduce(rewrites, len(self.tokens.tokens))
@@ -0,0 +1,123 @@
+"""
+Specializes refactoring listeners for their target at run time.
+
+The listeners compare every visited class, field and method name with attributes holding the
+target names, e.g., `self.source_class`. `build_listener` recompiles the hooks of a listener
+class with these attributes replaced by the target names as literals, and returns the compiled
+subclass. The hooks are compiled from the listener's own source, so the specialized class has
+no logic of its own. Hooks that the listener does not define stay unbound, and the
+`EarlyExitParseTreeWalker` and `DispatchCachingParseTreeWalker` do not call them. Generated
+classes are cached per (listener class, targets), so a target is compiled once per process.
+
+Example:
+
+    listener_class = build_listener(DecreaseFieldVisibilityListener, source_class="JSONObject", source_field="Object")
+    parse_and_walk(file_path=main_file, listener_class=listener_class, has_write=True,
+                   source_class="JSONObject", source_field="Object")
+
+"""
+
+import ast
+import functools
+import inspect
+import sys
+import textwrap
+
+from antlr4.tree.Tree import ParseTreeListener
+
+
+class _PinAttributes(ast.NodeTransformer):
+    """
+    Replaces the reads of `self.<target>` with the target's value.
+    """
+
+    def __init__(self, targets: dict):
+        self.targets = targets
+        self.pinned = False
+
+    def visit_Attribute(self, node: ast.Attribute):
+        self.generic_visit(node)
+        if isinstance(node.value, ast.Name) and node.value.id == "self" and node.attr in self.targets:
+            if not isinstance(node.ctx, ast.Load):
+                raise ValueError(f"Cannot pin {node.attr}, it is assigned outside __init__")
+            self.pinned = True
+            return ast.copy_location(ast.Constant(self.targets[node.attr]), node)
+        return node
+
+
+def _uses_class_cell(function: ast.FunctionDef):
+    # zero-argument super() needs the __class__ cell of the class body it was written in
+    return any(isinstance(node, ast.Name) and node.id in ("super", "__class__") for node in ast.walk(function))
+
+
+def _specialized_hooks(klass, targets: dict, defined: set):
+    """
+    Compiles the methods of `klass` that read a target attribute, with the targets pinned.
+    The methods are executed in the namespace of the module of `klass`, so they see the same globals.
+    """
+    try:
+        lines, first_line = inspect.getsourcelines(klass)
+        file_name = inspect.getsourcefile(klass)
+    except (OSError, TypeError):
+        # compiled (e.g., by Cython) or defined interactively
+        return {}
+    class_def = ast.parse(textwrap.dedent("".join(lines))).body[0]
+    functions = []
+    for node in class_def.body:
+        if not isinstance(node, ast.FunctionDef) or node.name == "__init__" or node.name in defined:
+            continue
+        defined.add(node.name)
+        if _uses_class_cell(node):
+            continue
+        transformer = _PinAttributes(targets)
+        node = transformer.visit(node)
+        if transformer.pinned:
+            functions.append(node)
+    if not functions:
+        return {}
+    module = ast.Module(body=functions, type_ignores=[])
+    ast.increment_lineno(module, first_line - 1)
+    ast.fix_missing_locations(module)
+    namespace = {}
+    exec(compile(module, file_name, "exec"), sys.modules[klass.__module__].__dict__, namespace)
+    return namespace
+
+
+@functools.lru_cache(maxsize=128)
+def _build(listener_class, targets: tuple):
+    targets = dict(targets)
+    namespace = {}
+    defined = set()
+    for klass in listener_class.__mro__:
+        if klass is ParseTreeListener or klass.__module__.startswith("gen."):
+            break
+        for name, function in _specialized_hooks(klass, targets, defined).items():
+            namespace.setdefault(name, function)
+
+    def __init__(self, *args, **kwargs):
+        listener_class.__init__(self, *args, **kwargs)
+        for attribute, value in targets.items():
+            if getattr(self, attribute) != value:
+                raise ValueError(f"{listener_class.__name__} was specialized for {attribute}={value!r}, "
+                                 f"not {getattr(self, attribute)!r}")
+
+    namespace["__init__"] = __init__
+    namespace["__module__"] = listener_class.__module__
+    namespace["__qualname__"] = listener_class.__qualname__
+    return type(listener_class.__name__, (listener_class,), namespace)
+
+
+def build_listener(listener_class, **targets):
+    """
+    Returns a subclass of the listener class with the given attributes pinned to their values.
+    The subclass is constructed with the same arguments as the listener class, and checks that
+    they set the pinned attributes to the pinned values.
+
+    :param listener_class: A refactoring listener, e.g., `DecreaseFieldVisibilityListener`.
+    :param targets: The names and values of the attributes holding the target, e.g., `source_class="Shape"`.
+    :return: A subclass of `listener_class`
+    """
+    for attribute, value in targets.items():
+        if not isinstance(value, str):
+            raise ValueError(f"Cannot pin {attribute} to {value!r}")
+    return _build(listener_class, tuple(sorted(targets.items())))
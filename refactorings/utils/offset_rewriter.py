@@ -0,0 +1,78 @@
+"""
+A rewriter which records edits as character offsets into the source text.
+
+Listeners that only replace, delete or insert around a few tokens do not need the operation
+program of `TokenStreamRewriter`: each edit is kept as a `(start, stop, text)` triple built from
+the tokens' `start`/`stop` character offsets, and the output is produced by one pass over the
+source joining the unchanged slices and the replacements.
+`OffsetRewriter` offers the `TokenStreamRewriter` methods used by the refactoring listeners.
+"""
+
+from antlr4 import CommonTokenStream
+from antlr4.Token import Token
+
+
+class OffsetRewriter:
+    __slots__ = ('tokens', 'source', 'edits')
+
+    def __init__(self, tokens: CommonTokenStream):
+        self.tokens = tokens
+        self.source = tokens.tokenSource.inputStream.strdata
+        # (start offset, stop offset (exclusive), sequence number, text)
+        self.edits = []
+
+    def replace(self, start: int, stop: int, text: str):
+        """
+        Replaces the source characters in [start, stop) with the given text.
+        """
+        self.edits.append((start, stop, len(self.edits), text or ''))
+
+    def replaceRange(self, from_idx: int, to_idx: int, text: str):
+        start_token = self.tokens.get(from_idx)
+        stop_token = self.tokens.get(to_idx)
+        self.replace(start_token.start, stop_token.stop + 1, text)
+
+    def replaceSingleToken(self, token: Token, text: str):
+        self.replace(token.start, token.stop + 1, text)
+
+    def replaceIndex(self, index: int, text: str):
+        self.replaceRange(index, index, text)
+
+    def delete(self, program_name, from_idx: int, to_idx: int):
+        self.replaceRange(from_idx, to_idx, '')
+
+    def insertBeforeIndex(self, index: int, text: str):
+        offset = self.tokens.get(index).start
+        self.replace(offset, offset, text)
+
+    def insertBeforeToken(self, token: Token, text: str):
+        self.replace(token.start, token.start, text)
+
+    def insertAfter(self, index: int, text: str):
+        offset = self.tokens.get(index).stop + 1
+        self.replace(offset, offset, text)
+
+    def insertAfterToken(self, token: Token, text: str):
+        self.replace(token.stop + 1, token.stop + 1, text)
+
+    def finalize(self) -> str:
+        """
+        Applies all the edits to the source text.
+        Insertions at an offset precede a replacement starting there, in the order they were made.
+
+        :return: The rewritten text
+        """
+        source = self.source
+        parts = []
+        position = 0
+        for start, stop, _, text in sorted(self.edits, key=lambda edit: (edit[0], edit[1] > edit[0], edit[2])):
+            if start < position:
+                raise ValueError("edit at {}..{} overlaps with a previous edit".format(start, stop))
+            parts.append(source[position:start])
+            parts.append(text)
+            position = stop
+        parts.append(source[position:])
+        return "".join(parts)
+
+    def getDefaultText(self) -> str:
+        return self.finalize()
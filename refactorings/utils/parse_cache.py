@@ -0,0 +1,140 @@
+"""
+Process-wide cache of ANTLR parse trees.
+
+Refactorings applied one after another on the same Java file would otherwise
+re-lex and re-parse it from scratch on every invocation. Entries are keyed by
+the file path and validated against the file's ``(mtime, size)``. When these
+differ, e.g., the file was touched or written back with the same text, the
+SHA-256 digest of the content decides whether the file is parsed again.
+
+Parse trees of large files are heavy, so only the ``MAX_CACHED_TREES`` most
+recently used ones are kept alive.
+
+When the java8speedy package is installed and ``sbse.config.USE_CPP_BACKEND``
+is set, the trees are parsed by its C++ backend. The tokens are still lexed
+in Python, since the translated trees carry no token stream to rewrite.
+"""
+
+import hashlib
+import os
+from collections import OrderedDict
+
+from antlr4 import CommonTokenStream
+from antlr4.atn.PredictionMode import PredictionMode
+from antlr4.error.ErrorStrategy import BailErrorStrategy, DefaultErrorStrategy
+from antlr4.error.Errors import ParseCancellationException
+
+from gen.javaLabeled.JavaLexer import JavaLexer
+from gen.javaLabeled.JavaParserLabeled import JavaParserLabeled
+from refactorings.utils.byte_input_stream import input_stream
+
+try:
+    from java8speedy.parser import sa_javalabeled
+except ImportError:
+    sa_javalabeled = None
+
+MAX_CACHED_TREES = 16
+
+# path -> (mtime, size, sha256 digest, token_stream, parse_tree), in least recently used order
+_parse_cache = OrderedDict()
+
+
+def get_parse_tree(path: str, source: bytes = None):
+    """
+    Returns the token stream and the parse tree of the given Java file.
+
+    :param path: The path of Java file to be parsed.
+    :param source: The content of the file if the caller has already read it.
+    :return: A tuple of (CommonTokenStream, CompilationUnitContext)
+    """
+    stat = os.stat(path)
+    entry = _parse_cache.get(path)
+    if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+        _parse_cache.move_to_end(path)
+        return entry[3], entry[4]
+
+    if source is None:
+        with open(path, 'rb') as f:
+            source = f.read()
+    digest = hashlib.sha256(source).digest()
+    if entry is not None and entry[2] == digest:
+        token_stream, parse_tree = entry[3], entry[4]
+    else:
+        stream = input_stream(source, path)
+        lexer = JavaLexer(stream)
+        token_stream = CommonTokenStream(lexer)
+        if _use_cpp_backend():
+            token_stream.fill()
+            stream.reset()
+            parse_tree = sa_javalabeled.parse(stream, 'compilationUnit')
+        else:
+            parse_tree = _parse(token_stream)
+    _parse_cache[path] = (stat.st_mtime_ns, stat.st_size, digest, token_stream, parse_tree)
+    _parse_cache.move_to_end(path)
+    while len(_parse_cache) > MAX_CACHED_TREES:
+        _parse_cache.popitem(last=False)
+    return token_stream, parse_tree
+
+
+def _use_cpp_backend() -> bool:
+    if sa_javalabeled is None or not sa_javalabeled.USE_CPP_IMPLEMENTATION:
+        return False
+    from sbse import config
+    return config.USE_CPP_BACKEND
+
+
+def _parse(token_stream: CommonTokenStream):
+    """
+    Two-stage parsing: the fast SLL prediction mode is tried first and,
+    only if it fails, the input is parsed again with the full LL mode.
+    SLL succeeds on virtually every Java file.
+    """
+    parser = JavaParserLabeled(token_stream)
+    parser._interp.predictionMode = PredictionMode.SLL
+    parser._errHandler = BailErrorStrategy()
+    try:
+        return parser.compilationUnit()
+    except ParseCancellationException:
+        token_stream.seek(0)
+        parser.reset()
+        parser._interp.predictionMode = PredictionMode.LL
+        parser._errHandler = DefaultErrorStrategy()
+        return parser.compilationUnit()
+
+
+def write_back(path: str, token_stream: CommonTokenStream, text: str, newline=''):
+    """
+    Writes the refactored text to the file only if it differs from the parsed source,
+    and drops the file's cached parse tree when it is written.
+
+    :param path: The path of Java file.
+    :param token_stream: The token stream that the file was parsed into.
+    :param text: The refactored text, e.g., `TokenStreamRewriter.getDefaultText()`.
+    :param newline: Passed to `open`.
+    :return: True if the file was written.
+    """
+    if text == token_stream.tokenSource.inputStream.strdata:
+        return False
+    with open(path, mode='w', newline=newline) as f:
+        f.write(text)
+    evict(path)
+    return True
+
+
+def evict(path: str):
+    """
+    Drops the cached parse tree of the given file, e.g., after it has been rewritten.
+
+    :param path: The path of Java file.
+    :return: None
+    """
+    _parse_cache.pop(path, None)
+
+
+def clear():
+    """
+    Drops all cached parse trees.
+
+    :return: None
+    """
+    _parse_cache.clear()
@@ -0,0 +1,67 @@
+"""
+Caches of lookups into Understand databases which are repeated across refactoring calls.
+"""
+
+import functools
+import os
+
+from refactorings.utils.db_pool import get_db, on_close
+
+
+@functools.lru_cache(maxsize=8)
+def _class_file_map(udb_path: str, udb_mtime: float) -> dict:
+    db = get_db(udb_path)
+    class_files = {cls.simplename(): cls.parent().longname(True) for cls in db.ents("class")}
+    return class_files
+
+
+def class_file_map(udb_path: str) -> dict:
+    """
+    Maps the simple name of each class in the project to the path of the file declaring it.
+    The map is built once per database and rebuilt when the database changes on disk.
+
+    :param udb_path: The path of understand database.
+    :return: A dict of {class simple name: file path}
+    """
+    return _class_file_map(udb_path, os.path.getmtime(udb_path))
+
+
+@functools.lru_cache(maxsize=1024)
+def _lookup(udb_path: str, udb_mtime: float, name: str, kind: str) -> tuple:
+    return tuple(get_db(udb_path).lookup(name, kind))
+
+
+def lookup(udb_path: str, name: str, kind: str) -> tuple:
+    """
+    Returns the entities of `db.lookup(name, kind)` on the pooled handle of the database.
+    The result is cached per database until the pooled handle which the entities belong to is closed,
+    e.g., when the database changes on disk.
+
+    :param udb_path: The path of understand database.
+    :param name: The (qualified) name of the entities.
+    :param kind: The Understand kind filter, e.g., `Class`.
+    :return: A tuple of entities
+    """
+    return _lookup(udb_path, os.path.getmtime(udb_path), name, kind)
+
+
+def resolve_class(udb_path: str, qualified_name: str):
+    """
+    Returns the class entity with the given qualified name, e.g., `org.json.JSONObject`.
+
+    :param udb_path: The path of understand database.
+    :param qualified_name: The qualified name of the class.
+    :return: The entity of the class, or None if it is not found
+    """
+    simple_name = qualified_name.rpartition(".")[2]
+    for ent in lookup(udb_path, qualified_name, "Class"):
+        if ent.simplename() == simple_name:
+            return ent
+    return None
+
+
+@on_close
+def _clear(udb_path: str):
+    # Cached results may come from the closed handle, and the caches are small, so all of them are dropped.
+    _class_file_map.cache_clear()
+    _lookup.cache_clear()
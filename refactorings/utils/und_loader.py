@@ -0,0 +1,22 @@
+"""
+Lazy import of the Understand Python API.
+
+Importing `understand` is slow and fails on machines without SciTools Understand, so the refactoring
+modules import it only when a database is actually opened.
+"""
+
+import importlib
+
+_und = None
+
+
+def understand():
+    """
+    Imports the `understand` module on the first call and returns the cached module afterwards.
+
+    :return: The `understand` module
+    """
+    global _und
+    if _und is None:
+        _und = importlib.import_module("understand")
+    return _und
@@ -2,7 +2,10 @@ from gen.javaLabeled.JavaLexer import JavaLexer
 from gen.javaLabeled.JavaParserLabeled import JavaParserLabeled
 
 from refactorings.utils.utils_listener_fast import *
-from utilization.directory_utils import create_project_parse_tree
+from refactorings.utils.byte_input_stream import file_input_stream
+from refactorings.utils.early_exit_walker import EarlyExitParseTreeWalker
+from refactorings.utils.fast_rewriter import FastTokenStreamRewriter
+from refactorings.utils.parse_cache import get_parse_tree, write_back
 
 
 def get_program(source_files: list, print_status=False) -> Program:
@@ -10,13 +13,13 @@ def get_program(source_files: list, print_status=False) -> Program:
     for filename in source_files:
         if print_status:
             print("Parsing " + filename)
-        stream = FileStream(filename, encoding='utf8')
+        stream = file_input_stream(filename)
         lexer = JavaLexer(stream)
         token_stream = CommonTokenStream(lexer)
         parser = JavaParser(token_stream)
         tree = parser.compilationUnit()
         listener = UtilsListener(filename)
-        walker = ParseTreeWalker()
+        walker = DispatchCachingParseTreeWalker()
         walker.walk(listener, tree)
 
         listener_package_name = listener.package.name or ""
@@ -32,13 +35,13 @@ def get_program(source_files: list, print_status=False) -> Program:
 def get_objects(source_files: str) -> FileInfo:
     objects = {}
     for filename in source_files:
-        stream = FileStream(filename, encoding='utf8')
+        stream = file_input_stream(filename)
         lexer = JavaLexer(stream)
         token_stream = CommonTokenStream(lexer)
         parser = JavaParser(token_stream)
         tree = parser.compilationUnit()
         listener = UtilsListener(filename)
-        walker = ParseTreeWalker()
+        walker = DispatchCachingParseTreeWalker()
         walker.walk(listener, tree)
 
         if not listener.package.name in objects:
@@ -71,7 +74,7 @@ class Rewriter:
                 if token_stream not in self.token_streams:
                     self.token_streams[token_stream] = (
                         _class.filename,
-                        TokenStreamRewriter(token_stream),
+                        FastTokenStreamRewriter(token_stream),
                         filename_mapping(_class.filename)
                     )
 
@@ -109,13 +112,13 @@ def get_program_with_field_usage(source_files: list, field_name: str, source_cla
     for filename in source_files:
         if print_status:
             print("Parsing " + filename)
-        stream = FileStream(filename, encoding='utf8')
+        stream = file_input_stream(filename)
         lexer = JavaLexer(stream)
         token_stream = CommonTokenStream(lexer)
         parser = JavaParser(token_stream)
         tree = parser.compilationUnit()
         listener = StaticFieldUsageListener(filename, field_name, source_class)
-        walker = ParseTreeWalker()
+        walker = DispatchCachingParseTreeWalker()
         walker.walk(listener, tree)
 
         if not listener.package.name in program.packages:
@@ -126,22 +129,19 @@ def get_program_with_field_usage(source_files: list, field_name: str, source_cla
     return program
 
 
-def parse_and_walk(file_path: str, listener_class, has_write=False, debug=False, **kwargs):
-    tree, rewriter = create_project_parse_tree(file_path)
+def parse_and_walk(file_path: str, listener_class, has_write=False, debug=False, source: bytes = None, **kwargs):
+    token_stream, tree = get_parse_tree(file_path, source=source)
     if has_write:
-        if rewriter is None:
-            raise Exception("Failed to create rewriter.")
-        kwargs.update({'rewriter': rewriter})
+        kwargs.update({'rewriter': FastTokenStreamRewriter(token_stream)})
     listener = listener_class(**kwargs)
-    ParseTreeWalker().walk(
+    EarlyExitParseTreeWalker().walk(
         listener,
         tree
     )
 
     if has_write:
         if not debug:
-            with open(file_path, 'w') as f:
-                f.write(listener.rewriter.getDefaultText())
+            write_back(file_path, token_stream, listener.rewriter.getDefaultText(), newline=None)
         else:
             print(listener.rewriter.getDefaultText())
 
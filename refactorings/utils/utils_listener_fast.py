@@ -8,6 +8,9 @@ An implementation of simple symbol table for the following refactorings:
 
 import os
 import re  # regular expressions
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 import antlr4
 from antlr4 import FileStream
 from antlr4.Token import CommonToken
@@ -20,6 +23,9 @@ from gen.java.JavaParserListener import JavaParserListener
 from antlr4 import FileStream, ParseTreeWalker
 from antlr4.TokenStreamRewriter import TokenStreamRewriter
 from gen.java.JavaLexer import JavaLexer
+from refactorings.utils.byte_input_stream import file_input_stream, input_stream
+from refactorings.utils.dispatch_walker import DispatchCachingParseTreeWalker
+from refactorings.utils.fast_rewriter import FastTokenStreamRewriter
 
 
 class Program:
@@ -476,13 +482,23 @@ class UtilsListener(JavaParserListener):
             self.current_method.body_local_vars_and_expr_names.append(MethodInvocation(ids, ctx))
 
     def enterCreator(self, ctx: JavaParser.CreatorContext):
-        try:
-            object_name = ctx.parentCtx.parentCtx.parentCtx.children[0].IDENTIFIER().getText()
-            class_name = ctx.parentCtx.parentCtx.parentCtx.parentCtx.parentCtx.children[0].children[0].getText()
-            self.objects_declaration[self.current_class_identifier][self.current_method_identifier][
-                object_name] = class_name
-        except:
-            pass
+        # `Type name = new Type(...)`: the variable declarator is the third ancestor of the creator
+        declarator = _ancestor(ctx, 3)
+        declaration = _ancestor(declarator, 2)
+        if declaration is None or not declarator.children or not declaration.children:
+            return
+        identifier = getattr(declarator.children[0], "IDENTIFIER", None)
+        identifier = identifier() if identifier is not None else None
+        if not isinstance(identifier, Tree.TerminalNode):
+            return
+        type_children = getattr(declaration.children[0], "children", None)
+        if not type_children:
+            return
+        method_objects = self.objects_declaration.get(self.current_class_identifier, {}).get(
+            self.current_method_identifier)
+        if method_objects is None:
+            return
+        method_objects[identifier.getText()] = type_children[0].getText()
 
     def enterExpression(self, ctx: JavaParser.ExpressionContext):
         if self.current_method is not None:
@@ -609,13 +625,10 @@ class StaticFieldUsageListener(UtilsListener):
         setattr(self.package.classes[self.current_class_name], "usages", self.usages)
 
     def enterBlock(self, ctx: JavaParser.BlockContext):
-        super().enterBlock(ctx)
-
         if len(self.stack) != 0:
             self.stack.append(self.field_name)
 
     def exitBlock(self, ctx: JavaParser.BlockContext):
-        super().exitBlock(ctx)
         try:
             self.stack.pop()
         except IndexError:
@@ -641,6 +654,17 @@ class StaticFieldUsageListener(UtilsListener):
             self.stack.append(var_name)
 
 
+def _ancestor(ctx, n: int):
+    """
+    Returns the n-th parent of the given context, or None if the tree is not that deep.
+    """
+    for _ in range(n):
+        if ctx is None:
+            return None
+        ctx = ctx.parentCtx
+    return ctx
+
+
 class FieldUsageListener(UtilsListener):
     """
     FieldUsageListener finds all the usage of
@@ -662,14 +686,23 @@ class FieldUsageListener(UtilsListener):
         # current class name is the public class in each file.
         self.current_class_name = ""
         self.field_candidates = field_candidates
+        self._field_candidates = frozenset(field_candidates)
         self.rewriter = None
         # this represents the text to be added in target i.e. public int a;
         self.field_tobe_moved = field_tobe_moved
         self.methods_tobe_updated = []
+        # token index -> texts to be inserted before it, in call order
+        self._pending_inserts = {}
+        # the rewritten file is saved once the walk is done, if the file declares any class
+        self._has_class_body = False
+        # text of `new Source(...)` expressions, without whitespace
+        self._new_source = f"new{source_class}"
+        accessor_suffix = field_name[0].upper() + field_name[1:-1]
+        self._accessor_names = frozenset(
+            (f"set{accessor_suffix}", f"get{accessor_suffix}", f"has{accessor_suffix}", f"is{accessor_suffix}"))
 
     def enterCompilationUnit(self, ctx: JavaParser.CompilationUnitContext):
-        super().enterCompilationUnit(ctx)
-        self.rewriter = TokenStreamRewriter(ctx.parser.getTokenStream())
+        self.rewriter = FastTokenStreamRewriter(ctx.parser.getTokenStream())
 
     def enterClassDeclaration(self, ctx: JavaParser.ClassDeclarationContext):
         super().enterClassDeclaration(ctx)
@@ -684,17 +717,18 @@ class FieldUsageListener(UtilsListener):
 
         # import target if we're not in Target and have not imported before
         if self.current_class_name != self.target_class:
-            self.rewriter.insertBeforeIndex(ctx.parentCtx.start.tokenIndex,
-                                            f"import {self.target_package}.{self.target_class};\n")
+            self._insert_before(ctx.parentCtx.start.tokenIndex,
+                                f"import {self.target_package}.{self.target_class};\n")
 
     def enterClassBody(self, ctx: JavaParser.ClassBodyContext):
-        super().exitClassBody(ctx)
+        super().enterClassBody(ctx)
         if self.current_class_name == self.target_class:
             replacement_text = ""
             if self.field_tobe_moved.name == self.field_name:
                 for mod in self.field_tobe_moved.modifiers:
                     replacement_text += f"{mod} "
                 replacement_text += f"{self.field_tobe_moved.datatype} {self.field_tobe_moved.name};"
+            self._flush_inserts()
             self.rewriter.insertAfter(ctx.start.tokenIndex, f"\n\t{replacement_text}\n")
 
             # add getter and setter
@@ -704,8 +738,8 @@ class FieldUsageListener(UtilsListener):
 
             getter = f"\tpublic {type} get{method_name}() {{ return this.{name}; }}\n"
             setter = f"\tpublic void set{method_name}({type} {name}) {{ this.{name} = {name}; }}\n"
-            self.rewriter.insertBeforeIndex(ctx.stop.tokenIndex, getter)
-            self.rewriter.insertBeforeIndex(ctx.stop.tokenIndex, setter)
+            # the setter goes first, as with two separate inserts at the same index
+            self._insert_before(ctx.stop.tokenIndex, setter + getter)
 
     def exitFieldDeclaration(self, ctx: JavaParser.FieldDeclarationContext):
         super().exitFieldDeclaration(ctx)
@@ -719,8 +753,25 @@ class FieldUsageListener(UtilsListener):
                 self.field_tobe_moved = field
 
     def exitClassBody(self, ctx: JavaParser.ClassBodyContext):
-        super().exitClassBody(ctx)
-        save(self.rewriter, self.filename)
+        self._has_class_body = True
+
+    def exitCompilationUnit(self, ctx: JavaParser.CompilationUnitContext):
+        if self._has_class_body:
+            self._flush_inserts()
+            save(self.rewriter, self.filename)
+
+    def _insert_before(self, index: int, text: str):
+        """
+        Buffers an insertion; the insertions at each index are passed to the rewriter as one operation.
+        The buffer is flushed before any other rewrite operation, so the operations keep their order.
+        """
+        self._pending_inserts.setdefault(index, []).append(text)
+
+    def _flush_inserts(self):
+        for index, texts in self._pending_inserts.items():
+            # a later insert at the same index goes before an earlier one, as in TokenStreamRewriter
+            self.rewriter.insertBeforeIndex(index, "".join(reversed(texts)))
+        self._pending_inserts.clear()
 
     def exitMethodDeclaration(self, ctx: JavaParser.MethodDeclarationContext):
         super().exitMethodDeclaration(ctx)
@@ -730,6 +781,7 @@ class FieldUsageListener(UtilsListener):
 
         if self.current_class_name == self.source_class and \
                 self.is_method_getter_or_setter(ctx.IDENTIFIER().getText()):
+            self._flush_inserts()
             self.rewriter.replaceRange(
                 ctx.parentCtx.parentCtx.start.tokenIndex,
                 ctx.parentCtx.parentCtx.stop.tokenIndex, "")
@@ -741,29 +793,29 @@ class FieldUsageListener(UtilsListener):
         super().exitConstructorDeclaration(ctx)
 
     def exitMethodBody(self, ctx: JavaParser.MethodBodyContext):
-        super().exitMethodBody(ctx)
-        self.handleMethodUsage(ctx, False)
+        if self.has_imported_source:
+            self.handleMethodUsage(ctx, False)
 
     def handleMethodUsage(self, ctx, is_constructor: bool):
+        # if we have not imported source package or
+        # Source class just ignore this
+        if not self.has_imported_source:
+            return
+
         method_identifier = ctx.IDENTIFIER().getText() if is_constructor else ctx.parentCtx.IDENTIFIER().getText()
         formal_params = ctx.formalParameters() if is_constructor else ctx.parentCtx.formalParameters()
-        target_added = False
         target_param_name = "$$target"
         target_param = f"Target {target_param_name}" if \
             len(self.current_method.parameters) == 0 \
             else f", Target {target_param_name}"
 
-        # if we have not imported source package or
-        # Source class just ignore this
-        if not self.has_imported_source:
-            return
-
         local_candidates = set()
         if self.current_class_name == self.source_class:
             # we will remove getter and setter from source
             # and add it to target so there is no need to
             # find usages there
             if self.is_method_getter_or_setter(method_identifier):
+                self._flush_inserts()
                 self.rewriter.replaceRange(ctx.start.tokenIndex, ctx.stop.tokenIndex, "")
                 return
             local_candidates.add("this")
@@ -779,87 +831,76 @@ class FieldUsageListener(UtilsListener):
                 if var_or_exprs.datatype == self.source_class:
                     local_candidates.add(var_or_exprs.identifier)
 
+        # names which may refer to a Source object in this method
+        candidates = local_candidates | self._field_candidates
         should_ignore = False
 
         for var_or_exprs in self.current_method.body_local_vars_and_expr_names:
-            if type(var_or_exprs) is ExpressionName:
+            var_or_exprs_type = type(var_or_exprs)
+            if var_or_exprs_type is LocalVariable:
+                continue
+            dot_separated_identifiers = var_or_exprs.dot_separated_identifiers
+            first_id = dot_separated_identifiers[0] if dot_separated_identifiers else None
+            second_id = dot_separated_identifiers[1] if len(dot_separated_identifiers) > 1 else None
+
+            if var_or_exprs_type is ExpressionName:
                 # we're going to find source.field
-                try:
-                    local_ctx = var_or_exprs.parser_context.parentCtx.parentCtx.parentCtx.parentCtx.parentCtx.parentCtx
-                    creator = local_ctx.expression()[0].getText()
-                    if creator.__contains__(
-                            f"new{self.source_class}") and local_ctx.IDENTIFIER().getText() == self.field_name:
+                local_ctx = _ancestor(var_or_exprs.parser_context, 6)
+                if type(local_ctx) is JavaParser.ExpressionContext and local_ctx.DOT() is not None:
+                    expressions = local_ctx.expression()
+                    identifier = local_ctx.IDENTIFIER()
+                    if expressions and identifier is not None and \
+                            self._new_source in expressions[0].getText() and identifier.getText() == self.field_name:
                         self.propagate_field(local_ctx, target_param_name)
 
-                except:
-                    pass
-
-                if len(var_or_exprs.dot_separated_identifiers) < 2:
+                if second_id is None:
                     continue
-                if (var_or_exprs.dot_separated_identifiers[0] in local_candidates or
-                    var_or_exprs.dot_separated_identifiers[0] in self.field_candidates) and \
-                        var_or_exprs.dot_separated_identifiers[1] == self.field_name:
-                    if not target_added:
-                        # add target to param
-                        self.rewriter.insertBeforeIndex(formal_params.stop.tokenIndex,
-                                                        target_param)
-                        self.methods_tobe_updated.append(self.current_method)
-                        target_added = True
+                if first_id in candidates and second_id == self.field_name:
+                    self._add_target_param(formal_params, target_param)
 
                     self.usages.append(var_or_exprs.parser_context)
                     self.propagate_field(var_or_exprs.parser_context, target_param_name)
 
-            elif type(var_or_exprs) is MethodInvocation:
+            elif var_or_exprs_type is MethodInvocation:
                 # we are going to find getter or setters
                 # if len(var_or_exprs.dot_separated_identifiers) < 2:
                 #     continue
-                if var_or_exprs.dot_separated_identifiers[0] == f"new{self.source_class}":
+                if first_id == self._new_source:
                     if var_or_exprs.parser_context.methodCall() is not None and \
                             self.is_method_getter_or_setter(
                                 var_or_exprs.parser_context.methodCall().IDENTIFIER().getText()):
                         self.propagate_getter_setter(var_or_exprs.parser_context, target_param_name)
-                elif self.is_method_getter_or_setter(var_or_exprs.dot_separated_identifiers[0]):
-                    if not target_added:
-                        # add target to param
-                        self.rewriter.insertBeforeIndex(formal_params.stop.tokenIndex,
-                                                        target_param)
-                        self.methods_tobe_updated.append(self.current_method)
-                        target_added = True
+                elif self.is_method_getter_or_setter(first_id):
+                    self._add_target_param(formal_params, target_param)
                     if not should_ignore and var_or_exprs.parser_context is not None and type(
                             var_or_exprs.parser_context) is not JavaParser.ExpressionContext:
                         continue
                     self.usages.append(var_or_exprs.parser_context)
                     self.propagate_getter_setter_form2(var_or_exprs.parser_context, target_param_name)
-                elif len(var_or_exprs.dot_separated_identifiers) > 1 and self.is_getter_or_setter(
-                        var_or_exprs.dot_separated_identifiers[0],
-                        var_or_exprs.dot_separated_identifiers[1], local_candidates):
-                    if not target_added:
-                        # add target to param
-                        self.rewriter.insertBeforeIndex(formal_params.stop.tokenIndex,
-                                                        target_param)
-                        self.methods_tobe_updated.append(self.current_method)
-                        target_added = True
+                elif second_id is not None and self.is_getter_or_setter(first_id, second_id, candidates):
+                    self._add_target_param(formal_params, target_param)
 
                     self.usages.append(var_or_exprs.parser_context)
                     self.propagate_getter_setter(var_or_exprs.parser_context, target_param_name)
 
-    def is_getter_or_setter(self, first_id: str, second_id: str, local_candidates: set):
-        return (first_id in local_candidates or first_id in self.field_candidates) and (
-                second_id == f"set{self.field_name[0].upper() + self.field_name[1:-1]}" or
-                second_id == f"get{self.field_name[0].upper() + self.field_name[1:-1]}" or
-                second_id == f"has{self.field_name[0].upper() + self.field_name[1:-1]}" or
-                second_id == f"is{self.field_name[0].upper() + self.field_name[1:-1]}"
-        )
+    def _add_target_param(self, formal_params: JavaParser.FormalParametersContext, target_param: str):
+        """
+        Adds the Target parameter to the current method, once, and records the method for updating its calls.
+        """
+        if self.methods_tobe_updated and self.methods_tobe_updated[-1] is self.current_method:
+            return
+        # add target to param
+        self._insert_before(formal_params.stop.tokenIndex, target_param)
+        self.methods_tobe_updated.append(self.current_method)
+
+    def is_getter_or_setter(self, first_id: str, second_id: str, candidates: set):
+        return first_id in candidates and second_id in self._accessor_names
 
     def is_method_getter_or_setter(self, method: str):
-        return (
-                method == f"set{self.field_name[0].upper() + self.field_name[1:-1]}" or
-                method == f"get{self.field_name[0].upper() + self.field_name[1:-1]}" or
-                method == f"has{self.field_name[0].upper() + self.field_name[1:-1]}" or
-                method == f"is{self.field_name[0].upper() + self.field_name[1:-1]}"
-        )
+        return method in self._accessor_names
 
     def propagate_getter_setter(self, ctx: JavaParser.ExpressionContext, target_name: str):
+        self._flush_inserts()
         index = ctx.DOT().symbol.tokenIndex
         self.rewriter.replaceRange(ctx.start.tokenIndex, index - 1, target_name)
 
@@ -867,19 +908,19 @@ class FieldUsageListener(UtilsListener):
         """
         form 2 is getA() setA()...
         """
+        self._flush_inserts()
         self.rewriter.insertBeforeIndex(ctx.start.tokenIndex, f"{target_name}.")
 
     def propagate_field(self, ctx: JavaParser.ExpressionContext, target_name: str):
+        self._flush_inserts()
         index = ctx.DOT().symbol.tokenIndex
         self.rewriter.replaceRange(ctx.start.tokenIndex, index - 1, target_name)
 
 
 def save(rewriter: TokenStreamRewriter, file_name: str, filename_mapping=lambda x: x + ".rewritten.java"):
-    new_filename = filename_mapping(file_name).replace("\\", "/")
-    path = new_filename[:new_filename.rfind('/')]
-    if not os.path.exists(path):
-        os.makedirs(path)
-    with open(new_filename, mode='w', newline='') as file:
+    new_filename = Path(filename_mapping(file_name))
+    new_filename.parent.mkdir(parents=True, exist_ok=True)
+    with new_filename.open(mode='w', newline='', buffering=1 << 20) as file:
         print("write?", new_filename)
         file.write(rewriter.getDefaultText())
 
@@ -891,37 +932,81 @@ class MethodUsageListener(UtilsListener):
         self.method_names = set(map(lambda m: m.name, methods))
         self.rewriter = None
         self.target_class = target_class
+        # the argument added to the calls of the updated methods, without and with preceding arguments
+        self._new_target = f"new {target_class}()"
+        self._new_target_arg = f", new {target_class}()"
 
     def enterCompilationUnit(self, ctx: JavaParser.CompilationUnitContext):
-        super().enterCompilationUnit(ctx)
-        self.rewriter = TokenStreamRewriter(ctx.parser.getTokenStream())
+        self.rewriter = FastTokenStreamRewriter(ctx.parser.getTokenStream())
 
     def enterClassCreatorRest(self, ctx: JavaParser.ClassCreatorRestContext):
         if type(ctx.parentCtx) is JavaParser.CreatorContext:
             if ctx.parentCtx.createdName().IDENTIFIER()[0].getText() not in self.method_names:
                 return
-        text = f"new {self.target_class}()" if ctx.arguments().expressionList() is None else f", new {self.target_class}()"
-        index = ctx.arguments().RPAREN().symbol.tokenIndex
-        self.rewriter.insertBeforeIndex(index, text)
+        arguments = ctx.arguments()
+        text = self._new_target if arguments.expressionList() is None else self._new_target_arg
+        self.rewriter.insertBeforeIndex(arguments.RPAREN().symbol.tokenIndex, text)
 
     def exitMethodCall(self, ctx: JavaParser.MethodCallContext):
-        super().exitMethodCall(ctx)
         if ctx.THIS() is not None:
             return
         if ctx.IDENTIFIER().getText() in self.method_names:
-            text = f"new {self.target_class}()" if ctx.expressionList() is None else f", new {self.target_class}()"
+            text = self._new_target if ctx.expressionList() is None else self._new_target_arg
             self.rewriter.insertBeforeIndex(ctx.RPAREN().symbol.tokenIndex, text)
 
     def exitClassBody(self, ctx: JavaParser.ClassBodyContext):
-        super().exitClassBody(ctx)
         save(self.rewriter, self.filename)
 
 
 def get_filenames_in_dir(directory_name: str, filter=lambda x: x.endswith(".java")) -> list:
-    result = []
-    for (dirname, dirnames, filenames) in os.walk(directory_name):
-        result.extend([dirname + '/' + name for name in filenames if filter(name)])
-    return result
+    """
+    :param directory_name: The project directory
+    :param filter: Selects the file names to be returned
+    :return: list
+    """
+    return list(_scan_dir(directory_name, filter))
+
+
+def _scan_dir(directory_name: str, filter):
+    """
+    Yields the paths of the files in the directory tree, those of a directory before its subdirectories.
+    """
+    subdirectories = []
+    with os.scandir(directory_name) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirectories.append(entry.path)
+            elif filter(entry.name):
+                yield entry.path
+    for subdirectory in subdirectories:
+        yield from _scan_dir(subdirectory, filter)
+
+
+def change_file_order(files: list, source_class: str, target_class: str) -> list:
+    """
+    :param files: List of files in the project directory
+    :param source_class: The class the field is moved from
+    :param target_class: The class the field is moved to
+    :return: list
+
+    Moves the files of the source and target classes to the front, in this order,
+    so that the moved field is known before the target class is rewritten
+    """
+
+    source_name = f"{source_class}.java"
+    target_name = f"{target_class}.java"
+    source_files = []
+    target_files = []
+    other_files = []
+    for file in files:
+        name = os.path.basename(file)
+        if name == source_name:
+            source_files.append(file)
+        elif name == target_name:
+            target_files.append(file)
+        else:
+            other_files.append(file)
+    return source_files + target_files + other_files
 
 
 def clean_up_dir(files: list) -> list:
@@ -947,7 +1032,6 @@ class PreConditionListener(UtilsListener):
         self.can_convert = True
 
     def enterInterfaceDeclaration(self, ctx: JavaParser.InterfaceDeclarationContext):
-        super().enterInterfaceDeclaration(ctx)
         if ctx.INTERFACE() is not None:
             self.can_convert = False
 
@@ -957,11 +1041,32 @@ class PreConditionListener(UtilsListener):
             self.can_convert = False
 
     def exitMethodBody(self, ctx: JavaParser.MethodBodyContext):
-        super().exitMethodBody(ctx)
         if self.current_method is None:
             self.can_convert = False
 
 
+_INNER_CREATOR = re.compile(rb'\.\s*new\b')
+
+
+def method_usage_worker(file: str, rewritten_file: str, method_names: list, target_class: str):
+    """
+    Passes the Target argument to the calls of the updated methods in the rewritten file in a worker process.
+    Only the method names are sent to the worker, since methods hold their parse trees.
+    """
+    with open(rewritten_file, 'rb') as f:
+        source = f.read()
+    # the listener only rewrites calls of the updated methods and inner class creators (`outer.new Inner()`)
+    if not any(name.encode() in source for name in method_names) and _INNER_CREATOR.search(source) is None:
+        return
+    stream = input_stream(source, rewritten_file)
+    lexer = JavaLexer(stream)
+    token_stream = CommonTokenStream(lexer)
+    parser = JavaParser(token_stream)
+    tree = parser.compilationUnit()
+    listener = MethodUsageListener(file, [Method(name=name) for name in method_names], target_class)
+    DispatchCachingParseTreeWalker().walk(listener, tree)
+
+
 if __name__ == '__main__':
     source_class = "JSONArray"
     source_package = "org.json"
@@ -971,16 +1076,18 @@ if __name__ == '__main__':
     path = ""
     files = get_filenames_in_dir(
         '/home/loop/Desktop/Ass/Compiler/CodART/benchmark_projects/JSON/src/main/java/org/json/')
+    files = change_file_order(files, source_class, target_class)
     field = None
     methods_tobe_update = []
+    source_file_name = f"{source_class}.java"
     for file in files:
-        stream = FileStream(file, encoding='utf8')
+        stream = file_input_stream(file)
         lexer = JavaLexer(stream)
         token_stream = CommonTokenStream(lexer)
         parser = JavaParser(token_stream)
         tree = parser.compilationUnit()
         utilsListener = PreConditionListener(file)
-        walker = ParseTreeWalker()
+        walker = DispatchCachingParseTreeWalker()
         walker.walk(utilsListener, tree)
 
         if not utilsListener.can_convert:
@@ -1008,19 +1115,13 @@ if __name__ == '__main__':
 
         methods_tobe_update = listener.methods_tobe_updated + methods_tobe_update
 
-        if file.__contains__(source_class):
+        if os.path.basename(file) == source_file_name:
             field = listener.field_tobe_moved
 
     # for method in methods_tobe_update:
     #     print(method.name)
 
     files2 = [f'{file.split(".")[0]}.rewritten.java' for file in files]
-    for i, file in enumerate(files):
-        stream = FileStream(files2[i], encoding='utf8')
-        lexer = JavaLexer(stream)
-        token_stream = CommonTokenStream(lexer)
-        parser = JavaParser(token_stream)
-        tree = parser.compilationUnit()
-        listener = MethodUsageListener(file, methods_tobe_update, target_class)
-        walker = ParseTreeWalker()
-        walker.walk(listener, tree)
+    method_names = [method.name for method in methods_tobe_update]
+    with ProcessPoolExecutor() as executor:
+        list(executor.map(method_usage_worker, files, files2, repeat(method_names), repeat(target_class)))
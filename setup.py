@@ -3,6 +3,46 @@ import setuptools
 with open("README.md", "r", encoding="utf-8") as fh:
     long_description = fh.read()
 
+try:
+    from setuptools.errors import CCompilerError, ExecError, PlatformError
+except ImportError:
+    from distutils.errors import CCompilerError, DistutilsExecError as ExecError, \
+        DistutilsPlatformError as PlatformError
+from setuptools.command.build_ext import build_ext
+
+# The token stream rewriter is compiled when Cython is available; it runs as pure Python otherwise.
+try:
+    from Cython.Build import cythonize
+    ext_modules = cythonize(["refactorings/utils/fast_rewriter.py"], language_level=3,
+                            compiler_directives={"annotation_typing": False})
+except ImportError:
+    ext_modules = []
+
+
+class OptionalBuildExt(build_ext):
+    """
+    Skips the compiled modules when there is no working C compiler, since they have pure Python sources.
+    """
+
+    def run(self):
+        self.skipped = set()
+        try:
+            super().run()
+        except PlatformError as e:
+            print(f"warning: not compiling the extension modules: {e}")
+
+    def build_extension(self, ext):
+        try:
+            super().build_extension(ext)
+        except (CCompilerError, ExecError, PlatformError) as e:
+            print(f"warning: not compiling {ext.name}: {e}")
+            self.skipped.add(ext.name)
+
+    def copy_extensions_to_source(self):
+        self.extensions = [ext for ext in self.extensions if ext.name not in self.skipped]
+        super().copy_extensions_to_source()
+
+
 setuptools.setup(
     name="codart",  # Replace with your own username
     version="0.1.0dev",
@@ -35,5 +75,7 @@ setuptools.setup(
                                                'sbse',
                                                'visualization',
                                                ]),
+    ext_modules=ext_modules,
+    cmdclass={'build_ext': OptionalBuildExt},
     python_requires=">=3.5",
 )
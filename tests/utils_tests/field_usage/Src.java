@@ -0,0 +1,8 @@
+package p;
+public class Src {
+    public int count;
+    public int getCoun() { return count; }
+    public void setCoun(int c) { count = c; }
+    void use() { this.count = 2; }
+    Runnable r = new Runnable() { public void run() { } };
+}
@@ -0,0 +1,9 @@
+package p;
+import p.Tgt;
+public class Src {
+    public int count;
+    
+    
+    void use(Target $$target) { $$target.count = 2; }
+    Runnable r = new Runnable() { public void run() { } };
+}
@@ -0,0 +1,5 @@
+package p;
+public class Tgt {
+    int x;
+
+}
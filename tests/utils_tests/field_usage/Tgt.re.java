@@ -0,0 +1,9 @@
+package p;
+public class Tgt {
+	public int count;
+
+    int x;
+
+	public void setCOUNToun(int count) { this.count = count; }
+	public int getCOUNToun() { return this.count; }
+}
@@ -0,0 +1,8 @@
+package p;
+import p.Src;
+public class User {
+    Src s;
+    int f(Src a) { Src b = new Src(); b.count = 4; a.setCoun(5); return a.count + s.getCoun(); }
+    Object o = new Object() { public String toString() { return "" ; } };
+    int g(Src z) { return z.count + z.getCoun(); }
+}
@@ -0,0 +1,9 @@
+package p;
+import p.Src;
+import p.Tgt;
+public class User {
+    Src s;
+    int f(Src a, Target $$target) { Src b = new Src(); $$target.count = 4; $$target.setCoun(5); return $$target.count + $$target.getCoun(); }
+    Object o = new Object() { public String toString() { return "" ; } };
+    int g(Src z, Target $$target) { return $$target.count + $$target.getCoun(); }
+}
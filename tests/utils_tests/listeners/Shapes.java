@@ -0,0 +1,28 @@
+package listeners;
+
+import java.util.Map;
+import java.io.Serializable;
+
+public class Shape implements Serializable {
+    protected double scale = 1.0;
+
+    public double area() {
+        return 0.0;
+    }
+
+    public String name() {
+        return "shape";
+    }
+}
+
+class Square extends Shape {
+    double side;
+}
+
+class Circle extends Shape {
+    double radius;
+
+    double perimeter() {
+        return 2 * radius;
+    }
+}
@@ -0,0 +1,16 @@
+package listeners;
+
+public class Task {
+    private final Runnable first = new Runnable() {
+        public void run() {
+        }
+    };
+
+    public void run() {
+        new Runnable() {
+            public void run() {
+                first.run();
+            }
+        }.run();
+    }
+}
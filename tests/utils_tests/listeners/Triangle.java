@@ -0,0 +1,5 @@
+package listeners;
+
+class Triangle extends Shape {
+    double base, height;
+}
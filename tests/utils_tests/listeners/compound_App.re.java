@@ -0,0 +1,34 @@
+package listeners;
+
+import java.util.List;
+
+public class App {
+    private int count;
+    public  int instances = 0;
+    protected static final String NAME = "app";
+    private int width;
+    protected int depth;
+
+    void testMethod() {
+        new Runnable() {
+            public void run() {
+                count++;
+            }
+        };
+    }
+
+    public static int size() {
+        return count;
+    }
+
+    static void helper() {
+    }
+}
+
+ class Other {
+    public int width;
+    static int instances;
+
+    void testMethod() {
+    }
+}
@@ -0,0 +1,34 @@
+package listeners;
+
+import java.util.List;
+
+public class App {
+    private int count;
+    public static int instances = 0;
+    protected  final String NAME = "app";
+    public int width;
+    protected int depth;
+
+    void testMethod() {
+        new Runnable() {
+            public void run() {
+                count++;
+            }
+        };
+    }
+
+    public int size() {
+        return count;
+    }
+
+    static void helper() {
+    }
+}
+
+final class Other {
+    public int width;
+    static int instances;
+
+    void testMethod() {
+    }
+}
@@ -0,0 +1,30 @@
+package listeners;
+
+import java.util.Map;
+import java.io.Serializable;
+
+public class Shape implements Serializable {
+    
+
+    public double area() {
+        return 0.0;
+    }
+
+    public String name() {
+        return "shape";
+    }
+}
+
+class Square extends Shape {
+	protected double scale = 1.0;
+    double side;
+}
+
+class Circle extends Shape {
+	protected double scale = 1.0;
+    double radius;
+
+    double perimeter() {
+        return 2 * radius;
+    }
+}
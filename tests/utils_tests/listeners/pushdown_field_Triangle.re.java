@@ -0,0 +1,9 @@
+package listeners;
+import java.util.Map;
+import java.io.Serializable;
+
+
+class Triangle extends Shape {
+	protected double scale = 1.0;
+    double base, height;
+}
@@ -0,0 +1,34 @@
+package listeners;
+
+import java.util.Map;
+import java.io.Serializable;
+
+public class Shape implements Serializable {
+    protected double scale = 1.0;
+
+    
+
+    public String name() {
+        return "shape";
+    }
+}
+
+class Square extends Shape {
+    double side;
+
+	public double area() {
+        return 0.0;
+    }
+}
+
+class Circle extends Shape {
+    double radius;
+
+    double perimeter() {
+        return 2 * radius;
+    }
+
+	public double area() {
+        return 0.0;
+    }
+}
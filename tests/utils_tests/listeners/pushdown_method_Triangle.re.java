@@ -0,0 +1,12 @@
+package listeners;
+import java.util.Map;
+import java.io.Serializable;
+
+
+class Triangle extends Shape {
+    double base, height;
+
+	public double area() {
+        return 0.0;
+    }
+}
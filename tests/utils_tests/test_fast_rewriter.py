@@ -0,0 +1,156 @@
+"""
+    FastTokenStreamRewriter against ANTLR's TokenStreamRewriter on random mixes of
+    insert, replace and delete operations.
+
+    run: python -m unittest discover -s tests/utils_tests
+"""
+
+import random
+import unittest
+
+from antlr4 import CommonTokenStream, InputStream
+from antlr4.TokenStreamRewriter import TokenStreamRewriter
+
+from gen.javaLabeled.JavaLexer import JavaLexer
+from refactorings.utils.fast_rewriter import FastTokenStreamRewriter
+
+SOURCE = """package p;
+import q.Z;
+public class Shape extends Base {
+    private static int count = 0;
+    protected final String name;
+    public Shape(String name) { this.name = name; count++; }
+    public double area() { return 0.0; }
+    @Override
+    public String toString() { return name + ":" + area(); }
+}
+"""
+
+
+def _token_stream():
+    token_stream = CommonTokenStream(JavaLexer(InputStream(SOURCE)))
+    token_stream.fill()
+    return token_stream
+
+
+def _random_program(rng: random.Random, size: int, token_count: int):
+    program = []
+    for n in range(rng.randint(1, 12)):
+        kind = rng.choice(("insertBeforeIndex", "insertAfter", "replaceRange", "delete"))
+        start = rng.randrange(token_count)
+        if kind in ("insertBeforeIndex", "insertAfter"):
+            program.append((kind, start, f"<{n}>"))
+        else:
+            stop = min(token_count - 1, start + rng.randrange(size))
+            text = f"[{n}]" if kind == "replaceRange" and rng.random() < 0.8 else None
+            program.append((kind, start, stop, text))
+    return program
+
+
+def _apply(rewriter: TokenStreamRewriter, program):
+    for kind, *args in program:
+        if kind == "insertBeforeIndex":
+            rewriter.insertBeforeIndex(args[0], args[1])
+        elif kind == "insertAfter":
+            rewriter.insertAfter(args[0], args[1])
+        elif kind == "replaceRange":
+            rewriter.replaceRange(args[0], args[1], args[2])
+        else:
+            rewriter.delete(rewriter.DEFAULT_PROGRAM_NAME, args[0], args[1])
+
+
+def _text(rewriter_class, program, start=None, stop=None):
+    """
+    Returns the rewritten text, or the type of the exception raised while computing it.
+    A fresh rewriter is used each time, since TokenStreamRewriter consumes its program in getText.
+    """
+    token_stream = _token_stream()
+    rewriter = rewriter_class(token_stream)
+    _apply(rewriter, program)
+    if start is None:
+        start, stop = 0, len(token_stream.tokens) - 1
+    try:
+        return rewriter.getText(rewriter.DEFAULT_PROGRAM_NAME, start, stop)
+    except (ValueError, TypeError):
+        # TokenStreamRewriter raises TypeError when formatting the message of some ValueErrors
+        return ValueError
+
+
+class FastTokenStreamRewriterTest(unittest.TestCase):
+    def setUp(self):
+        self.token_count = len(_token_stream().tokens)
+
+    def assertSameText(self, program, start=None, stop=None):
+        expected = _text(TokenStreamRewriter, program, start, stop)
+        actual = _text(FastTokenStreamRewriter, program, start, stop)
+        # TokenStreamRewriter fails on some programs which FastTokenStreamRewriter reduces as the Java
+        # runtime does, e.g., several insertions at one index, and it writes the text of a deletion
+        # merged with an insertion as "None".
+        if expected is ValueError:
+            if actual is not ValueError:
+                return
+        elif "None" in expected:
+            return
+        self.assertEqual(actual, expected, program)
+
+    def test_no_operations(self):
+        self.assertSameText([])
+        self.assertEqual(_text(FastTokenStreamRewriter, []), SOURCE)
+
+    def test_inserts_at_one_index(self):
+        self.assertSameText([("insertBeforeIndex", 5, "a"), ("insertBeforeIndex", 5, "b")])
+        self.assertSameText([("insertAfter", 4, "a"), ("insertBeforeIndex", 5, "b")])
+        self.assertSameText([("insertBeforeIndex", 5, "a"), ("insertAfter", 4, "b")])
+
+    def test_insert_at_replace_start(self):
+        self.assertSameText([("insertBeforeIndex", 5, "a"), ("replaceRange", 5, 9, "r")])
+        self.assertSameText([("replaceRange", 5, 9, "r"), ("insertBeforeIndex", 5, "a")])
+
+    def test_insert_within_replace(self):
+        self.assertSameText([("insertBeforeIndex", 7, "a"), ("replaceRange", 5, 9, "r")])
+        self.assertEqual(_text(FastTokenStreamRewriter, [("replaceRange", 5, 9, "r"), ("insertBeforeIndex", 7, "a")]),
+                         ValueError)
+
+    def test_overlapping_replaces(self):
+        self.assertSameText([("replaceRange", 5, 9, "a"), ("replaceRange", 3, 12, "b")])
+        self.assertSameText([("delete", 5, 9, None), ("delete", 8, 12, None)])
+        self.assertSameText([("replaceRange", 5, 9, "a"), ("replaceRange", 8, 12, "b")])
+
+    def test_insert_after_last_token(self):
+        self.assertSameText([("insertAfter", self.token_count - 1, "tail")])
+        self.assertSameText([("insertAfter", self.token_count - 2, "tail")])
+
+    def test_random_programs(self):
+        rng = random.Random(20201115)
+        for _ in range(2000):
+            program = _random_program(rng, rng.choice((1, 3, 10)), self.token_count)
+            self.assertSameText(program)
+
+    def test_random_programs_in_intervals(self):
+        rng = random.Random(1115)
+        for _ in range(600):
+            program = _random_program(rng, 4, self.token_count)
+            start = rng.randrange(self.token_count)
+            stop = rng.randrange(start, self.token_count)
+            self.assertSameText(program, start, stop)
+
+    def test_get_text_twice(self):
+        token_stream = _token_stream()
+        rewriter = FastTokenStreamRewriter(token_stream)
+        rewriter.replaceRange(5, 9, "r")
+        rewriter.insertBeforeIndex(2, "a")
+        self.assertEqual(rewriter.getDefaultText(), rewriter.getDefaultText())
+
+    def test_program_is_not_changed(self):
+        token_stream = _token_stream()
+        rewriter = FastTokenStreamRewriter(token_stream)
+        _apply(rewriter, [("insertBeforeIndex", 5, "a"), ("insertAfter", 4, "b"), ("replaceRange", 5, 9, "r"),
+                          ("delete", 12, 14, None), ("delete", 11, 16, None)])
+        program = [(type(op), op.index, op.text) for op in rewriter.programs[rewriter.DEFAULT_PROGRAM_NAME]]
+        rewriter.getDefaultText()
+        self.assertEqual([(type(op), op.index, op.text) for op in rewriter.programs[rewriter.DEFAULT_PROGRAM_NAME]],
+                         program)
+
+
+if __name__ == '__main__':
+    unittest.main()
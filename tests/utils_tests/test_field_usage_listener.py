@@ -0,0 +1,66 @@
+"""
+    FieldUsageListener on classes with anonymous class bodies.
+    The expected *.re.java files are the outputs of the original listener,
+    which saved the rewritten file on every exit of a class body.
+
+    run: python -m unittest discover -s tests/utils_tests
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from antlr4 import CommonTokenStream, FileStream, ParseTreeWalker
+
+from gen.java.JavaLexer import JavaLexer
+from gen.java.JavaParser import JavaParser
+from refactorings.utils.utils_listener_fast import FieldUsageListener, PreConditionListener
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'field_usage')
+
+
+class FieldUsageListenerTest(unittest.TestCase):
+    def setUp(self):
+        self.project_dir = tempfile.mkdtemp()
+        for name in ('Src', 'Tgt', 'User'):
+            shutil.copy(os.path.join(DATA_DIR, f'{name}.java'), self.project_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.project_dir)
+
+    def test_move_field(self):
+        field = None
+        methods_tobe_updated = []
+        # the source and the target are processed first, as in the driver
+        for name in ('Src', 'Tgt', 'User'):
+            file = os.path.join(self.project_dir, f'{name}.java')
+            token_stream = CommonTokenStream(JavaLexer(FileStream(file, encoding='utf8')))
+            tree = JavaParser(token_stream).compilationUnit()
+            walker = ParseTreeWalker()
+            pre_condition = PreConditionListener(file)
+            walker.walk(pre_condition, tree)
+            self.assertTrue(pre_condition.can_convert)
+            field_candidates = set()
+            for klass in pre_condition.package.classes.values():
+                for f in klass.fields.values():
+                    if f.datatype == 'Src':
+                        field_candidates.add(f.name)
+
+            listener = FieldUsageListener(file, 'Src', 'p', 'Tgt', 'p', 'count', field_candidates, field)
+            walker.walk(listener, tree)
+            methods_tobe_updated += [method.name for method in listener.methods_tobe_updated]
+            if name == 'Src':
+                field = listener.field_tobe_moved
+
+        self.assertEqual(methods_tobe_updated, ['use', 'f', 'g'])
+        for name in ('Src', 'Tgt', 'User'):
+            with open(os.path.join(self.project_dir, f'{name}.java.rewritten.java'), newline='') as f:
+                actual = f.read()
+            with open(os.path.join(DATA_DIR, f'{name}.re.java'), newline='') as f:
+                expected = f.read()
+            self.assertEqual(actual, expected, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+"""
+    The refactoring listeners, specialized and walked as their main() functions walk them, against
+    the outputs of the original listeners. Each case rewrites a file of the listeners directory and compares it
+    with listeners/<case>.re.java.
+
+    Where the listeners were changed on purpose, the expected file differs from the original
+    output: the pushdown refactorings no longer insert the parent's imports again into its own
+    file, decrease_field_visibility no longer rewrites fields of the same name in other classes, and
+    make_method_static no longer rewrites methods of the same name in anonymous classes.
+
+    run: python -m unittest discover -s tests/utils_tests
+"""
+
+import functools
+import os
+import shutil
+import tempfile
+import unittest
+
+from refactorings import pushdown_field2, pushdown_method2
+from refactorings.compound import apply_batch
+from refactorings.decrease_field_visibility import DecreaseFieldVisibilityListener
+from refactorings.make_class_non_final import MakeNonFinalClassRefactoringListener
+from refactorings.make_field_non_static import MakeFieldNonStaticRefactoringListener
+from refactorings.make_method_static_2 import MakeMethodStaticRefactoringListener
+from refactorings.utils import parse_cache
+from refactorings.utils.early_exit_walker import EarlyExitParseTreeWalker
+from refactorings.utils.listener_codegen import build_listener
+from refactorings.utils.utils2 import parse_and_walk
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'listeners')
+
+
+class RefactoringListenersTest(unittest.TestCase):
+    def setUp(self):
+        self.project_dir = tempfile.mkdtemp()
+        self.copy_sources()
+
+    def tearDown(self):
+        shutil.rmtree(self.project_dir)
+        parse_cache.clear()
+
+    def copy_sources(self):
+        parse_cache.clear()
+        for name in ('App.java', 'Shapes.java', 'Triangle.java', 'Task.java'):
+            shutil.copy(os.path.join(DATA_DIR, name), self.project_dir)
+
+    def assertRewritten(self, file_name, case):
+        with open(os.path.join(self.project_dir, file_name), newline='') as f:
+            actual = f.read()
+        with open(os.path.join(DATA_DIR, f'{case}.re.java'), newline='') as f:
+            expected = f.read()
+        self.assertEqual(actual, expected, case)
+
+    def walk(self, file_name, create_listener):
+        """
+        Walks the listener over the cached tree of the file and writes the file back, as the make_* main()s do.
+        """
+        path = os.path.join(self.project_dir, file_name)
+        token_stream, parse_tree = parse_cache.get_parse_tree(path)
+        listener = create_listener(token_stream)
+        EarlyExitParseTreeWalker().walk(t=parse_tree, listener=listener)
+        parse_cache.write_back(path, token_stream, listener.token_stream_rewriter.getDefaultText())
+
+    def test_make_method_static(self):
+        for method_name in ('testMethod', 'size', 'helper'):
+            with self.subTest(method_name):
+                self.copy_sources()
+                listener_class = build_listener(MakeMethodStaticRefactoringListener, source_class='App',
+                                                method_name=method_name)
+                self.walk('App.java', lambda token_stream: listener_class(
+                    common_token_stream=token_stream, source_class='App', method_name=method_name))
+                self.assertRewritten('App.java', f'make_method_static_{method_name}')
+
+    def test_make_method_static_with_anonymous_classes(self):
+        # the anonymous classes in the field initializer and in the target declare methods of the same name
+        listener_class = build_listener(MakeMethodStaticRefactoringListener, source_class='Task', method_name='run')
+        self.walk('Task.java', lambda token_stream: listener_class(
+            common_token_stream=token_stream, source_class='Task', method_name='run'))
+        self.assertRewritten('Task.java', 'make_method_static_run')
+
+    def test_make_field_non_static(self):
+        for field_name in ('instances', 'NAME'):
+            with self.subTest(field_name):
+                self.copy_sources()
+                listener_class = build_listener(MakeFieldNonStaticRefactoringListener, source_class='App',
+                                                field_name=field_name)
+                self.walk('App.java', lambda token_stream: listener_class(
+                    common_token_stream=token_stream, source_class='App', field_name=field_name))
+                self.assertRewritten('App.java', f'make_field_non_static_{field_name}')
+
+    def test_make_class_non_final(self):
+        listener_class = build_listener(MakeNonFinalClassRefactoringListener, objective_class='Other')
+        self.walk('App.java', lambda token_stream: listener_class(
+            common_token_stream=token_stream, class_name='Other'))
+        self.assertRewritten('App.java', 'make_class_non_final_Other')
+
+    def test_decrease_field_visibility(self):
+        for field_name in ('width', 'depth'):
+            with self.subTest(field_name):
+                self.copy_sources()
+                parse_and_walk(
+                    file_path=os.path.join(self.project_dir, 'App.java'),
+                    listener_class=build_listener(DecreaseFieldVisibilityListener, source_class='App',
+                                                  source_field=field_name),
+                    has_write=True,
+                    source_class='App',
+                    source_field=field_name
+                )
+                self.assertRewritten('App.java', f'decrease_field_visibility_{field_name}')
+
+    def test_compound(self):
+        # the rewrites of the make_* and decrease_field_visibility cases above, in one walk
+        apply_batch(os.path.join(self.project_dir, 'App.java'), [
+            {"kind": "make_class_non_final", "class": "Other"},
+            {"kind": "make_method_static", "class": "App", "method": "size"},
+            {"kind": "make_field_non_static", "class": "App", "field": "instances"},
+            {"kind": "decrease_field_visibility", "class": "App", "field": "width"},
+        ])
+        self.assertRewritten('App.java', 'compound_App')
+
+    def test_specialized_listener(self):
+        listener_class = build_listener(DecreaseFieldVisibilityListener, source_class='App', source_field='width')
+        self.assertIs(build_listener(DecreaseFieldVisibilityListener, source_class='App', source_field='width'),
+                      listener_class)
+        self.assertTrue(issubclass(listener_class, DecreaseFieldVisibilityListener))
+        self.assertIn('App', listener_class.is_source_class.fget.__code__.co_consts)
+        with self.assertRaises(ValueError):
+            listener_class(source_class='Other', source_field='width', rewriter=None)
+
+    def test_pushdown_field(self):
+        listener = parse_and_walk(
+            file_path=os.path.join(self.project_dir, 'Shapes.java'),
+            listener_class=functools.partial(
+                build_listener(pushdown_field2.CutPasteFieldListener, source_class='Shape', field_name='scale'),
+                target_class_names=['Square', 'Circle']
+            ),
+            has_write=True,
+            source_class='Shape',
+            field_name='scale'
+        )
+        pushdown_field2._paste_field(os.path.join(self.project_dir, 'Triangle.java'), ['Triangle'],
+                                     listener.field_content, listener.import_statements)
+        self.assertRewritten('Shapes.java', 'pushdown_field_Shapes')
+        self.assertRewritten('Triangle.java', 'pushdown_field_Triangle')
+
+    def test_pushdown_method(self):
+        listener = parse_and_walk(
+            file_path=os.path.join(self.project_dir, 'Shapes.java'),
+            listener_class=functools.partial(
+                build_listener(pushdown_method2.CutPasteMethodListener, source_class='Shape', method_name='area'),
+                target_class_names=['Square', 'Circle']
+            ),
+            has_write=True,
+            source_class='Shape',
+            method_name='area'
+        )
+        pushdown_method2._paste_method(os.path.join(self.project_dir, 'Triangle.java'), ['Triangle'],
+                                       listener.method_content, listener.import_statements)
+        self.assertRewritten('Shapes.java', 'pushdown_method_Shapes')
+        self.assertRewritten('Triangle.java', 'pushdown_method_Triangle')
+
+
+if __name__ == '__main__':
+    unittest.main()